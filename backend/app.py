@@ -3,121 +3,1020 @@ Flask backend för Simulink WebView Navigation System
 Förenklad implementation med .slx-baserad navigation
 """
 
-from flask import Flask, jsonify, Response
+from flask import Flask, g, jsonify, request, send_file, Response
 import os
 from flask_cors import CORS
 from pathlib import Path
 import json
+import logging
 import re
-from typing import Dict, List, Tuple
+import threading
+import time
+import zlib
+from concurrent.futures import wait
+from typing import Dict, List, Tuple, Union
 from collections import defaultdict
 
+from config import get_config
+from file_prefetch import FilePrefetcher
+from manifest import ManifestCache, Manifest, safe_relative_name
+from hierarchy_reader import load_hierarchy
+from metrics import metrics
+from mirror import ReleaseMirror
+from prewarm import TreePrewarmer
+from process_local import ProcessLocalExecutor
+from release_snapshot import SnapshotStore, iter_bytes
+from search_index import SearchIndex, SearchIndexer
+from shared_cache import SharedCache
+from single_flight import SingleFlight
+from svg_optimize import SvgOptimizer, choose_encoding
+from thumbnail_bundle import BUNDLE_MIMETYPE, pack_bundle, thumbnail_file
+from tree_cache import TreeCache, estimate_size
+from tree_format import COMPACT_MIMETYPE, compact_tree
+from tree_index import TreeIndex, file_signature, probe_digest
+from version_diff import ContentHasher, diagram_files, diff_hierarchies
+
+# Loggnivå styrs via LOG_LEVEL (DEBUG ger spårning per nod och element vid trädbygge)
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger('lia')
+
 app = Flask(__name__)
 CORS(app)
 
-NETWORK_PATH = Path(os.getenv('RELEASES_DIR', r"\\FS01\release_hub$\System_Releases")).resolve()
+config = get_config()
+
+# Releaserötter i prioritetsordning: RELEASE_ROOTS (config.py), annars RELEASES_DIR eller config.BASE_PATH
+if os.getenv('RELEASE_ROOTS'):
+    RELEASE_ROOTS = config.RELEASE_ROOTS
+elif os.getenv('RELEASES_DIR'):
+    RELEASE_ROOTS = [Path(os.environ['RELEASES_DIR']).resolve()]
+else:
+    RELEASE_ROOTS = [config.BASE_PATH]
+
+# Sekunder som en skanning väntar på varje rot innan den svarar med senast kända resultat för roten
+ROOT_SCAN_TIMEOUT = float(os.getenv('ROOT_SCAN_TIMEOUT', str(config.ROOT_SCAN_TIMEOUT)))
+
+# Persistent trädindex (tom sträng stänger av indexet)
+TREE_INDEX_PATH = os.getenv('TREE_INDEX_PATH', str(Path(__file__).parent / 'cache' / 'tree_index.sqlite'))
+
+# Intervall i sekunder för inkrementell bakgrundsskanning (0 stänger av)
+SCAN_INTERVAL = float(os.getenv('SCAN_INTERVAL', str(config.CACHE_TIMEOUT)))
+
+# Sekunder mellan mtime-kontroller av en slwebview_files-katalogs manifest
+MANIFEST_TTL = float(os.getenv('MANIFEST_TTL', '2'))
+
+# Lokal spegel av releasefiler (tom sträng stänger av) och dess maxstorlek i MB
+MIRROR_DIR = os.getenv('MIRROR_DIR', str(Path(__file__).parent / 'cache' / 'mirror'))
+MIRROR_MAX_MB = int(os.getenv('MIRROR_MAX_MB', '2048'))
+
+# Budget för trädcachen i minnet (antal poster och MB) samt för cachade diagrams_1.json-hierarkier
+TREE_CACHE_MAX_ENTRIES = int(os.getenv('TREE_CACHE_MAX_ENTRIES', '64'))
+TREE_CACHE_MAX_MB = int(os.getenv('TREE_CACHE_MAX_MB', '512'))
+HIERARCHY_CACHE_MAX_ENTRIES = int(os.getenv('HIERARCHY_CACHE_MAX_ENTRIES', '16'))
+
+# Budget för härledda resultat: kompakta träd, klickkartor, thumbnail-buntar och versionsjämförelser
+ARTIFACT_CACHE_MAX_ENTRIES = int(os.getenv('ARTIFACT_CACHE_MAX_ENTRIES', '256'))
+ARTIFACT_CACHE_MAX_MB = int(os.getenv('ARTIFACT_CACHE_MAX_MB', '256'))
+
+# Förvärmning: antal senaste versioner per produkt (0 stänger av) och antal trådar
+PREWARM_LATEST = int(os.getenv('PREWARM_LATEST', '2'))
+PREWARM_WORKERS = int(os.getenv('PREWARM_WORKERS', '2'))
+
+# Cache-Control max-age för releasefiler (releasemappar är oföränderliga)
+FILE_CACHE_MAX_AGE = int(os.getenv('FILE_CACHE_MAX_AGE', str(365 * 24 * 3600)))
+
+# Antal samtidiga fil-läsningar vid trädbygge (1 = sekventiellt). På SMB domineras tiden av latens per anrop
+BUILD_CONCURRENCY = int(os.getenv('BUILD_CONCURRENCY', '8'))
+
+# Antal trådar som hashar diagramfiler vid versionsjämförelse
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', '8'))
+
+# Sekunder som en okänd produkt/version kommer ihåg att den saknades innan en förfrågan får skanna om
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '30'))
+
+# Releasemappar heter <Produkt>[.<nr>]_<version>; produktnamn som inte kan matcha skannas aldrig efter
+RELEASE_FOLDER_PATTERN = re.compile(r'^([A-Za-z0-9]+)(?:\.(\d+))?_(.+)$')
+PRODUCT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9]+$')
+MAX_NEGATIVE_ENTRIES = 1024
+
+# Filcache i minnet (MB, 0 stänger av) - serverade SVG:ers klickbara barn förhämtas dit
+FILE_PREFETCH_MB = int(os.getenv('FILE_PREFETCH_MB', '64'))
+FILE_PREFETCH_WORKERS = int(os.getenv('FILE_PREFETCH_WORKERS', '4'))
+
+# Lokal katalog för minifierade och förkomprimerade SVG:er (tom sträng stänger av optimeringen) och dess maxstorlek i MB
+SVG_OPTIMIZE_DIR = os.getenv('SVG_OPTIMIZE_DIR', str(Path(__file__).parent / 'cache' / 'svg'))
+SVG_OPTIMIZE_WORKERS = int(os.getenv('SVG_OPTIMIZE_WORKERS', '2'))
+SVG_OPTIMIZE_MAX_MB = int(os.getenv('SVG_OPTIMIZE_MAX_MB', '512'))
+
+# Lokal katalog med kompilerade releasesnapshots (se release_snapshot.py, tom sträng stänger av)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', str(Path(__file__).parent / 'cache' / 'snapshots'))
+
+# Delad cache mellan arbetsprocesser (t.ex. gunicorn-workers) på samma maskin (tom sträng stänger av)
+# och sekunder innan ett bygglån från en process som inte svarar tas över
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', str(Path(__file__).parent / 'cache' / 'shared_cache.sqlite'))
+SHARED_LEASE_TTL = float(os.getenv('SHARED_LEASE_TTL', '120'))
+
+# Max antal filer per anrop till batch-endpointen
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '64'))
+
+# Batch-endpointen returnerar innehållet som JSON-text - bara textfiler (UTF-8) kan skickas så
+BATCH_TEXT_SUFFIXES = ('.svg', '.json')
+
+# Låt en framförliggande webbserver (nginx/Apache) skicka filerna via X-Sendfile
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', 'False').lower() == 'true'
 
 class SimulinkFileScanner:
     """Skannar och organiserar Simulink WebView-filer"""
     
-    def __init__(self, base_path: str):
-        self.base_path = Path(base_path)
+    def __init__(self, roots: Union[str, List[str]], tree_index: TreeIndex = None, manifest_ttl: float = 2.0,
+                 mirror: ReleaseMirror = None, tree_cache: TreeCache = None, hierarchy_cache: TreeCache = None,
+                 content_hasher: ContentHasher = None, build_concurrency: int = 1, negative_ttl: float = 30.0,
+                 root_timeout: float = 10.0, snapshots: SnapshotStore = None, shared_cache: SharedCache = None,
+                 artifact_cache: TreeCache = None):
+        # Rötterna anges i prioritetsordning - finns samma version i flera vinner den första
+        self.roots = [Path(roots)] if isinstance(roots, (str, Path)) else [Path(root) for root in roots]
+        self.root_timeout = root_timeout
+        self.root_health = {}
+        self._root_state = {}
+        self._root_scans = {}
+        self._root_lock = threading.Lock()
+        self._root_pool = ProcessLocalExecutor(max_workers=len(self.roots), thread_name_prefix='root-scan')
         self.products = {}
-        self.tree_cache = {}
+        self.tree_cache = tree_cache if tree_cache is not None else TreeCache()
+        self.hierarchy_cache = hierarchy_cache if hierarchy_cache is not None else TreeCache(max_entries=16)
+        # Härledda resultat (kompakta träd, klickkartor, thumbnail-buntar, diffar) har egen budget
+        # så att de inte vräker byggda träd
+        self.artifact_cache = artifact_cache if artifact_cache is not None else TreeCache(max_entries=256)
+        self.tree_index = tree_index
+        self.manifests = ManifestCache(revalidate_after=manifest_ttl)
+        self.mirror = mirror
+        self.snapshots = snapshots
+        self.shared_cache = shared_cache
+        self.content_hasher = content_hasher if content_hasher is not None else ContentHasher(tree_index)
+        self.build_concurrency = build_concurrency
+        self._io_pool = (ProcessLocalExecutor(max_workers=build_concurrency, thread_name_prefix='tree-io')
+                         if build_concurrency > 1 else None)
+        self.scan_listeners = []
+        self.last_scan = None
+        self.scan_interval = 0
+        self._scan_thread = None
+        self._scan_thread_pid = None
+        self._scan_lock = threading.Lock()
+        self._scan_flight = SingleFlight('scan')
+        self._build_flight = SingleFlight('build')
+        self.negative_ttl = negative_ttl
+        self._missing = {}
+        self._missing_lock = threading.Lock()
         
-    def scan_products(self) -> Dict:
-        """Skannar alla mappar och grupperar per produkt"""
-        if not self.base_path.exists():
-            return {"error": f"Sökvägen finns inte: {self.base_path}"}
+    def scan_products(self, full: bool = False, max_age: float = None) -> Dict:
+        """Skannar releaserötterna inkrementellt och grupperar per produkt
         
-        products = defaultdict(list)
-        print(f"🔍 Skannar: {self.base_path}")
+        Varje releasemapp kommer ihåg sin stat-signatur (mtime). Bara nya eller
+        ändrade mappar probas efter WebView-katalogen, övriga återanvänds.
+        Rötterna skannas samtidigt; en rot som inte svarar inom `root_timeout`
+        bidrar med sitt senast kända resultat och markeras i `root_health`.
+        Samtidiga anrop delar på en pågående skanning, och skanningar körs
+        aldrig parallellt. Den nya snapshoten ersätter `products` i ett svep.
         
-        for item in self.base_path.iterdir():
-            if not item.is_dir():
-                continue
+        Med delad cache skannar bara en process åt gången; övriga tar över
+        dess resultat. En skanning från en annan process som är högst
+        `max_age` sekunder gammal används i stället för att skanna själv.
+        """
+        return self._scan_flight.do(('scan', full), lambda: self._scan_products(full, max_age))
+    
+    def _scan_products(self, full: bool, max_age: float = None) -> Dict:
+        with self._scan_lock:
+            if self.shared_cache is None:
+                return self._scan_release_folders(full)
             
-            match = re.match(r'^([A-Za-z0-9]+)(?:\.(\d+))?_(.+)$', item.name)
+            since = time.time() - (max_age or 0)
+            local = []
             
-            if match:
-                product_name = match.group(1)
-                version = match.group(3)
-                webview_folder = f"WebView_{product_name}"
-                webview_path = item / webview_folder / "support" / "slwebview_files"
-                
-                if webview_path.exists():
-                    print(f"✅ Hittade: {product_name} v{version}")
-                    products[product_name].append({
-                        'version': version,
-                        'folder': item.name,
-                        'webview_path': str(webview_path)
-                    })
-                else:
-                    print(f"⚠️  Ingen WebView-mapp för: {item.name}")
+            def scan():
+                snapshot = self._scan_release_folders(full)
+                local.append(snapshot)
+                if "error" in snapshot:
+                    return snapshot
+                with self._root_lock:
+                    state = {path: dict(folders) for path, folders in self._root_state.items()}
+                return {"products": snapshot, "roots": self.root_status(), "state": state,
+                        "scanned_at": self.last_scan}
+            
+            shared = self.shared_cache.do('scan', scan, since=since)
+            return local[0] if local else self._adopt_scan(shared)
+    
+    def _adopt_scan(self, shared: Dict) -> Dict:
+        """Tar över en skanning som en annan process delat (om den är nyare än vår egen)"""
+        if self.last_scan is not None and shared['scanned_at'] <= self.last_scan:
+            return self.products
+        
+        with self._root_lock:
+            for root in shared['roots']:
+                if root['status'] != 'pending':
+                    self.root_health[root['path']] = {k: v for k, v in root.items() if k not in ('path', 'priority')}
+            # Mappstatusen följer med så att nästa egna skanning blir inkrementell och inte probar om allt
+            for path, folders in shared.get('state', {}).items():
+                self._root_state[path] = {name: tuple(entry) for name, entry in folders.items()}
+        
+        snapshot = shared['products']
+        self.products = snapshot
+        self.last_scan = shared['scanned_at']
+        logger.info("📥 Använder delad skanning: %d produkter", len(snapshot))
+        self._notify_scan_listeners(snapshot)
+        return snapshot
+    
+    def _notify_scan_listeners(self, snapshot: Dict) -> None:
+        for listener in self.scan_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.exception("⚠️  Fel i skanningslyssnare: %s", e)
+    
+    def _scan_release_folders(self, full: bool) -> Dict:
+        futures = [self._root_scan(root, full) for root in self.roots]
+        wait(futures, timeout=self.root_timeout)
+        
+        with self._root_lock:
+            for root, future in zip(self.roots, futures):
+                if not future.done():
+                    health = self.root_health.setdefault(str(root), {})
+                    health.update(status='timeout', error=f"Inget svar inom {self.root_timeout:g} s")
+                    logger.warning("⏱️  %s svarade inte inom %g s - använder senast kända resultat",
+                                   root, self.root_timeout)
+            states = [self._root_state.get(str(root)) for root in self.roots]
+            inspected = sum(self.root_health.get(str(root), {}).get('inspected', 0)
+                            for root, future in zip(self.roots, futures) if future.done())
+        
+        if all(state is None for state in states):
+            return {"error": f"Sökvägen finns inte: {', '.join(str(root) for root in self.roots)}",
+                    "roots": self.root_status()}
+        
+        # Första roten vinner när samma version finns i flera rötter
+        products = defaultdict(list)
+        seen = set()
+        for state in states:
+            for entry in (state or {}).values():
+                if entry[1] is None:
+                    continue
+                product_name, version_info = entry[1]
+                if (product_name, version_info['version']) in seen:
+                    continue
+                seen.add((product_name, version_info['version']))
+                products[product_name].append(version_info)
         
         for product in products:
             products[product].sort(key=lambda x: x['version'], reverse=True)
         
-        self.products = dict(products)
-        print(f"📊 Totalt {len(self.products)} produkter hittade")
+        # Byt ut hela snapshoten på en gång - läsare ser antingen den gamla eller den nya
+        snapshot = dict(products)
+        self.products = snapshot
+        self.last_scan = time.time()
+        logger.info("📊 Totalt %d produkter hittade (%d mappar inspekterade)", len(snapshot), inspected)
+        
+        self._notify_scan_listeners(snapshot)
+        return snapshot
+    
+    def _root_scan(self, root: Path, full: bool):
+        """Startar en skanning av roten, eller returnerar den som redan pågår (t.ex. efter en timeout)"""
+        with self._root_lock:
+            future = self._root_scans.get(str(root))
+            if future is None or future.done():
+                previous = {} if full else self._root_state.get(str(root), {})
+                future = self._root_pool.submit(self._scan_root, root, previous)
+                self._root_scans[str(root)] = future
+            return future
+    
+    def _scan_root(self, root: Path, previous: Dict) -> None:
+        """Skannar en rot och sparar dess mappstatus och hälsa (körs i rotens tråd)"""
+        start = time.perf_counter()
+        folder_state = {}
+        inspected = 0
+        try:
+            if not root.exists():
+                raise FileNotFoundError(f"Sökvägen finns inte: {root}")
+            
+            logger.info("🔍 Skannar: %s", root)
+            with os.scandir(root) as entries:
+                for item in entries:
+                    if not item.is_dir():
+                        continue
+                    
+                    try:
+                        mtime_ns = item.stat().st_mtime_ns
+                    except OSError:
+                        continue
+                    
+                    # En releasemapp utan WebView-katalog probas om varje gång - slwebview_files ligger
+                    # tre nivåer ner och kan kopieras in efter mappen utan att mappens mtime ändras
+                    entry = previous.get(item.name)
+                    if entry is not None and entry[0] == mtime_ns and (
+                            entry[1] is not None or not RELEASE_FOLDER_PATTERN.match(item.name)):
+                        folder_state[item.name] = entry
+                        continue
+                    
+                    inspected += 1
+                    folder_state[item.name] = (mtime_ns, self._inspect_release_folder(Path(item.path)))
+        except Exception as e:
+            logger.warning("⚠️  Kunde inte skanna %s: %s", root, e)
+            with self._root_lock:
+                health = self.root_health.setdefault(str(root), {})
+                health.update(status='missing' if isinstance(e, FileNotFoundError) else 'error', error=str(e),
+                              scan_ms=round((time.perf_counter() - start) * 1000, 1), inspected=0)
+            return
+        
+        with self._root_lock:
+            self._root_state[str(root)] = folder_state
+            self.root_health[str(root)] = {
+                'status': 'ok',
+                'error': None,
+                'scan_ms': round((time.perf_counter() - start) * 1000, 1),
+                'folders': len(folder_state),
+                'inspected': inspected,
+                'last_ok': time.time()
+            }
+    
+    def root_status(self) -> List[Dict]:
+        """Returnerar hälsa per rot i prioritetsordning"""
+        with self._root_lock:
+            return [dict({'path': str(root), 'priority': i, 'status': 'pending'}, **self.root_health.get(str(root), {}))
+                    for i, root in enumerate(self.roots)]
+    
+    def _inspect_release_folder(self, item: Path):
+        """Probar en releasemapp efter WebView-katalog, returnerar (produkt, versionsinfo) eller None"""
+        match = RELEASE_FOLDER_PATTERN.match(item.name)
+        if not match:
+            return None
+        
+        product_name = match.group(1)
+        version = match.group(3)
+        webview_folder = f"WebView_{product_name}"
+        webview_path = item / webview_folder / "support" / "slwebview_files"
+        
+        if webview_path.exists():
+            logger.debug("✅ Hittade: %s v%s", product_name, version)
+            return product_name, {
+                'version': version,
+                'folder': item.name,
+                'webview_path': str(webview_path)
+            }
+        
+        logger.debug("⚠️  Ingen WebView-mapp för: %s", item.name)
+        return None
+    
+    def ensure_scanned(self) -> Dict:
+        """Skannar endast om ingen skanning gjorts ännu"""
+        if self.last_scan is None:
+            return self.scan_products(max_age=self.scan_interval)
         return self.products
     
+    def ensure_product(self, product: str, version: str = None):
+        """Returnerar produktens versionslista (eller None), och skannar om vid okänd produkt/version
+        
+        En miss kommer ihåg i `negative_ttl` sekunder, så upprepade förfrågningar
+        på namn som inte finns inte kan trigga en skanning var. Produktnamn som
+        aldrig kan matcha en releasemapp leder inte till någon skanning alls.
+        """
+        self.ensure_scanned()
+        versions = self.products.get(product)
+        if versions is not None and (version is None or any(v['version'] == version for v in versions)):
+            return versions
+        if not PRODUCT_NAME_PATTERN.match(product):
+            return versions
+        
+        key = (product, version)
+        with self._missing_lock:
+            missed_at = self._missing.get(key)
+        if missed_at is not None and time.time() - missed_at < self.negative_ttl:
+            metrics.inc('negative_cache_hits')
+            return versions
+        
+        self.scan_products()
+        versions = self.products.get(product)
+        if versions is None or (version is not None and not any(v['version'] == version for v in versions)):
+            with self._missing_lock:
+                if len(self._missing) >= MAX_NEGATIVE_ENTRIES:
+                    self._missing.clear()
+                self._missing[key] = time.time()
+        return versions
+    
+    def start_background_scan(self, interval: float) -> None:
+        """Startar en daemon-tråd som skannar om inkrementellt med jämna mellanrum
+        
+        Tråden hör till processen som startade den - efter en fork (t.ex.
+        gunicorn --preload) finns den inte i barnet, så ett anrop från en ny
+        process startar en egen tråd.
+        """
+        if interval <= 0 or self._scan_thread_pid == os.getpid():
+            return
+        self.scan_interval = interval
+        self._scan_thread_pid = os.getpid()
+        
+        def loop():
+            while True:
+                try:
+                    # Har en annan process skannat under intervallet används dess resultat
+                    self.scan_products(max_age=interval)
+                except Exception as e:
+                    logger.exception("❌ Fel vid bakgrundsskanning: %s", e)
+                time.sleep(interval)
+        
+        self._scan_thread = threading.Thread(target=loop, name='release-scanner', daemon=True)
+        self._scan_thread.start()
+    
     def build_tree_from_root(self, product: str, version: str, use_cache: bool = True) -> Dict:
-        """Bygger navigeringsträd från diagrams_1.json med korrekt klickbarhetslogik"""
+        """Bygger navigeringsträd från diagrams_1.json med korrekt klickbarhetslogik
+        
+        Samtidiga anrop för samma produkt/version delar på ett och samma bygge.
+        """
+        return self._build_flight.do(('tree', product, version, use_cache),
+                                     lambda: self._build_tree_from_root(product, version, use_cache))
+    
+    def _build_tree_from_root(self, product: str, version: str, use_cache: bool) -> Dict:
+        # Kompilerade versioner har trädet färdigt i snapshoten - inga filsystemsanrop behövs
+        snapshot = self.snapshot_for(product, version) if use_cache else None
+        if snapshot is not None:
+            return snapshot.tree()
+        
         cache_key = f"{product}:{version}"
-        if use_cache and cache_key in self.tree_cache:
-            print(f"📦 Använder cached träd för {product} v{version}")
-            return self.tree_cache[cache_key]
+        source = self._version_source(product, version)
+        if "error" in source:
+            # Nätverksresursen kan vara tillfälligt borta - servera senast byggda träd om det finns
+            stale = self.tree_cache.peek(cache_key) if use_cache else None
+            return stale if stale is not None else source
+        
+        def signature(tree: Dict) -> Tuple:
+            return self._tree_signature(source, tree)
+        
+        if use_cache:
+            # Vilka externa hierarkier som ska kontrolleras avgörs av det cachade trädet
+            cached = self.tree_cache.peek(cache_key)
+            tree = self.tree_cache.get(cache_key, signature(cached)) if cached is not None else None
+            if tree is not None:
+                logger.debug("📦 Använder cached träd för %s v%s", product, version)
+                return tree
+        
+        if use_cache and self.shared_cache is not None:
+            # Bara en process bygger - övriga läser trädet ur den delade cachen
+            tree = self.shared_cache.do(f"tree:{cache_key}",
+                                        lambda: self._load_or_build_tree(product, version, source, use_cache),
+                                        signature=signature)
+        else:
+            tree = self._load_or_build_tree(product, version, source, use_cache)
+        
+        if "error" not in tree:
+            self.tree_cache.put(cache_key, tree, signature(tree))
+        return tree
+    
+    def _tree_signature(self, source: Dict, tree: Dict) -> Tuple:
+        """Signaturen ett cachat träd valideras mot: diagrams_1.json plus trädets externa hierarkier"""
+        return tuple(source['diagrams_sig']), tuple(self._external_signature(source['webview_path'], tree))
+    
+    def _external_signature(self, webview_path: Path, tree: Dict) -> List[Tuple]:
+        """(filnamn, storlek, mtime_ns) för varje extern <modell>_diagrams_1.json som trädet löste upp
+        
+        Signaturerna kontrolleras högst en gång per MANIFEST_TTL, så en cacheträff frågar inte nätverket.
+        """
+        names = set(tree.get('external_hierarchies', {})) | set(tree.get('external_errors', {}))
+        signature = []
+        for name in sorted(names):
+            try:
+                signature.append((name,) + tuple(self.manifests.signature(webview_path / name)))
+            except OSError:
+                signature.append((name, None, None))
+        return signature
+    
+    def _load_or_build_tree(self, product: str, version: str, source: Dict, use_cache: bool) -> Dict:
+        """Läser trädet ur det persistenta indexet, eller bygger det från diagrams_1.json"""
+        cache_key = f"{product}:{version}"
+        webview_path = source['webview_path']
+        diagrams_sig = tuple(source['diagrams_sig'])
+        
+        # Försök återanvända träd från det persistenta indexet
+        if use_cache and self.tree_index is not None:
+            tree = self._load_indexed_tree(product, version, webview_path, diagrams_sig)
+            if tree is not None:
+                logger.info("💾 Använder indexerat träd för %s v%s", product, version)
+                return tree
+        
+        logger.info("🔨 Bygger träd för %s v%s från %s", product, version, source['diagrams_json'])
+        build_start = time.perf_counter()
+        
+        try:
+            context = self._load_hierarchy(cache_key, source, use_cache=use_cache)
+            root_node = context['root']
+            
+            logger.debug("📊 Totalt %d noder i hierarkin, root: %s (hid:%s)",
+                         len(context['nodes_by_hid']), root_node.get('name'), root_node.get('hid'))
+            
+            # Bygg träd rekursivt från root
+            tree = self._build_tree_node(webview_path, product, root_node, context['nodes_by_hid'],
+                                         context['nodes_by_sid'], source['files'], level=0)
+            external_hierarchies = self._resolve_external_hierarchies(product, version, source, context, tree)
+            
+            build_ms = (time.perf_counter() - build_start) * 1000
+            metrics.observe('tree_build_ms', build_ms)
+            logger.info("✅ Träd byggt och cachat för %s v%s (%.1f ms)", product, version, build_ms)
+            
+            if self.tree_index is not None:
+                probed_nodes = context['hierarchy'] + [node for h in external_hierarchies for node in h]
+                self._store_indexed_tree(product, version, webview_path, source['diagrams_sig'],
+                                         probed_nodes, tree, self._external_signature(webview_path, tree))
+            
+            return tree
+            
+        except Exception as e:
+            logger.exception("❌ Fel vid läsning av diagrams_1.json: %s", e)
+            return {"error": str(e)}
+    
+    def _resolve_external_hierarchies(self, product: str, version: str, source: Dict, context: Dict,
+                                      tree: Dict) -> List[List[Dict]]:
+        """Löser upp ModelRef-element med egen <namn>_diagrams_1.json
+        
+        Varje extern hierarki parsas och byggs en gång per release och läggs i
+        trädets rot under `external_hierarchies` (nycklad på filnamn), så alla
+        block som refererar samma modell delar samma delträd. Referenser som
+        leder tillbaka till en modell som redan håller på att lösas upp
+        rapporteras i `external_cycles` istället för att följas.
+        Returnerar de parsade hierarkierna (för indexets probe-lista).
+        """
+        root_file = source['diagrams_json'].name
+        prefetched = {}
+        if self._io_pool is not None:
+            prefetched = self._prefetch_external_hierarchies(product, version, source, context, root_file)
+        
+        externals = {}
+        errors = {}
+        cycles = []
+        parsed = []
+        
+        def references(node: Dict) -> List[str]:
+            found = []
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                for element in current.get('clickable_elements', []):
+                    if element.get('hierarchy_type') == 'external':
+                        found.append(element['external_hierarchy'])
+                stack.extend(current.get('children', []))
+            return list(dict.fromkeys(found))
+        
+        def resolve(filename: str, chain: List[str]) -> None:
+            if filename in chain:
+                cycles.append(chain[chain.index(filename):] + [filename])
+                return
+            if filename in externals or filename in errors:
+                return
+            
+            try:
+                context = prefetched.get(filename)
+                if isinstance(context, Exception):
+                    raise context
+                if context is None:
+                    context = self._load_external_hierarchy(product, version, source, filename)
+            except Exception as e:
+                logger.warning("⚠️  Kunde inte läsa extern hierarki %s för %s v%s: %s", filename, product, version, e)
+                errors[filename] = str(e)
+                return
+            
+            model = filename[:-len('_diagrams_1.json')]
+            subtree = self._build_tree_node(source['webview_path'], model, context['root'], context['nodes_by_hid'],
+                                            context['nodes_by_sid'], source['files'], level=0)
+            externals[filename] = subtree
+            parsed.append(context['hierarchy'])
+            
+            for reference in references(subtree):
+                resolve(reference, chain + [filename])
+        
+        for reference in references(tree):
+            resolve(reference, [root_file])
+        
+        if externals:
+            tree['external_hierarchies'] = externals
+            metrics.inc('external_hierarchies', len(externals))
+        if cycles:
+            tree['external_cycles'] = cycles
+            logger.info("🔁 Cykliska modellreferenser i %s v%s: %s", product, version,
+                        ["/".join(c) for c in cycles])
+        if errors:
+            tree['external_errors'] = errors
+        return parsed
+    
+    def _prefetch_external_hierarchies(self, product: str, version: str, source: Dict, context: Dict,
+                                       root_file: str) -> Dict:
+        """Läser alla nåbara externa hierarkier parallellt i I/O-poolen, nivå för nivå
+        
+        Returnerar {filnamn: kontext eller undantag}. Själva trädet byggs sedan
+        i samma ordning som sekventiellt, så resultatet blir identiskt.
+        """
+        loaded = {}
+        frontier = [name for name in self._external_references(context, source['files']) if name != root_file]
+        while frontier:
+            futures = {name: self._io_pool.submit(self._load_external_hierarchy, product, version, source, name)
+                       for name in frontier}
+            discovered = []
+            for name, future in futures.items():
+                try:
+                    loaded[name] = future.result()
+                except Exception as e:
+                    loaded[name] = e
+                    continue
+                discovered.extend(self._external_references(loaded[name], source['files']))
+            frontier = [name for name in dict.fromkeys(discovered) if name not in loaded and name != root_file]
+        return loaded
+    
+    def _external_references(self, context: Dict, files: Manifest) -> List[str]:
+        """Externa hierarkifiler som en hierarki refererar (samma villkor som trädbygget)"""
+        nodes_by_sid = context['nodes_by_sid']
+        found = []
+        for node in context['hierarchy']:
+            children_hids = node.get('children', [])
+            for element in node.get('elements', []):
+                element_sid = element.get('sid') or ''
+                if element.get('icon') != 'MdlRefBlockIcon_icon' or ':' not in element_sid:
+                    continue
+                product_prefix, sid_number = element_sid.split(':')[:2]
+                if f"{product_prefix}_{sid_number}_d.svg" not in files:
+                    continue
+                child_node = nodes_by_sid.get(element_sid)
+                if child_node and child_node.get('hid') in children_hids:
+                    continue
+                external_diagrams = f"{element.get('name')}_diagrams_1.json"
+                if external_diagrams in files:
+                    found.append(external_diagrams)
+        return list(dict.fromkeys(found))
+    
+    def _load_external_hierarchy(self, product: str, version: str, source: Dict, filename: str) -> Dict:
+        """Läser en extern <modell>_diagrams_1.json i samma releasemapp (cachas som övriga hierarkier)"""
+        if filename not in source['files']:
+            raise FileNotFoundError(filename)
+        
+        path = source['webview_path'] / filename
+        external_source = dict(source, diagrams_json=path, diagrams_sig=file_signature(path))
+        return self._load_hierarchy(f"{product}:{version}:{filename}", external_source)
+    
+    def get_compact_tree_payload(self, product: str, version: str, tree: Dict) -> bytes:
+        """Returnerar trädet serialiserat i kompakt format, cachat så länge trädet är detsamma"""
+        cache_key = f"{product}:{version}:compact"
+        cached = self.artifact_cache.get(cache_key, id(tree))
+        if cached is not None:
+            return cached[1]
+        
+        payload = json.dumps(compact_tree(tree), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        # Trädreferensen hålls i posten så att id(tree) inte kan återanvändas medan posten lever
+        self.artifact_cache.put(cache_key, (tree, payload), id(tree), size=len(payload))
+        return payload
+    
+    def clickable_svgs(self, product: str, version: str, svg_name: str) -> List[str]:
+        """Returnerar SVG-filerna bakom ett diagrams klickbara element (bara om trädet redan är byggt)"""
+        tree = self.tree_cache.peek(f"{product}:{version}")
+        if tree is None:
+            return []
+        
+        cache_key = f"{product}:{version}:clickable"
+        cached = self.artifact_cache.get(cache_key, id(tree))
+        if cached is None:
+            targets = {}
+            stack = [tree] + list(tree.get('external_hierarchies', {}).values())
+            while stack:
+                node = stack.pop()
+                if node.get('svg'):
+                    targets.setdefault(node['svg'], []).extend(
+                        element['svg'] for element in node.get('clickable_elements', []) if element.get('svg'))
+                stack.extend(node.get('children', []))
+            # Trädreferensen hålls i posten så att id(tree) inte kan återanvändas medan posten lever
+            cached = (tree, targets)
+            self.artifact_cache.put(cache_key, cached, id(tree), size=estimate_size(targets))
+        return cached[1].get(svg_name, [])
+    
+    def get_subtree(self, product: str, version: str, hid: int = None, path: str = None, depth: int = 1) -> Dict:
+        """Bygger en enskild nod (via hid eller sökväg) med begränsat djup
+        
+        Barn bortom `depth` returneras som stubbar (`stub: True`) som kan
+        expanderas med ett nytt anrop på deras hid.
+        """
+        source = self._version_source(product, version)
+        if "error" in source:
+            return source
+        
+        try:
+            context = self._load_hierarchy(f"{product}:{version}", source)
+        except Exception as e:
+            return {"error": str(e)}
+        
+        nodes_by_hid = context['nodes_by_hid']
+        if path:
+            node = self._find_node_by_path(context, path)
+        elif hid is not None:
+            node = nodes_by_hid.get(hid)
+        else:
+            node = context['root']
+        
+        if not node:
+            return {"error": "Nod inte hittad"}
+        
+        # Räkna fram nodens position i hierarkin
+        ancestors = []
+        parent = nodes_by_hid.get(node.get('parent'))
+        while parent is not None and len(ancestors) < len(nodes_by_hid):
+            ancestors.append(parent['hid'])
+            parent = nodes_by_hid.get(parent.get('parent'))
+        ancestors.reverse()
         
-        if product not in self.products:
+        subtree = self._build_tree_node(source['webview_path'], product, node, nodes_by_hid,
+                                        context['nodes_by_sid'], source['files'], level=len(ancestors),
+                                        max_depth=depth)
+        subtree['path'] = ancestors + [node.get('hid')]
+        return subtree
+    
+    def _version_source(self, product: str, version: str) -> Dict:
+        """Slår upp versionens slwebview_files-katalog och diagrams_1.json-signatur"""
+        versions = self.products.get(product)
+        if versions is None:
             return {"error": "Produkt inte hittad"}
         
-        version_data = next((v for v in self.products[product] if v['version'] == version), None)
+        version_data = next((v for v in versions if v['version'] == version), None)
         if not version_data:
             return {"error": "Version inte hittad"}
         
         webview_path = Path(version_data['webview_path'])
         diagrams_json = webview_path / f"{product}_diagrams_1.json"
+        files = self.manifests.get(webview_path)
+        
+        if diagrams_json.name not in files:
+            return {"error": f"Diagrams JSON hittades inte: {product}_diagrams_1.json"}
         
-        if not diagrams_json.exists():
+        try:
+            diagrams_sig = self.manifests.signature(diagrams_json)
+        except OSError:
             return {"error": f"Diagrams JSON hittades inte: {product}_diagrams_1.json"}
         
-        print(f"\n🔨 Bygger träd för {product} v{version}...")
-        print(f"📄 Läser: {diagrams_json}")
+        return {
+            'folder': version_data['folder'],
+            'webview_path': webview_path,
+            'diagrams_json': diagrams_json,
+            'diagrams_sig': diagrams_sig,
+            'files': files
+        }
+    
+    def _load_hierarchy(self, cache_key: str, source: Dict, use_cache: bool = True) -> Dict:
+        """Läser diagrams_1.json och bygger lookup-tabeller (cachas per signatur)"""
+        if use_cache:
+            context = self.hierarchy_cache.get(cache_key, tuple(source['diagrams_sig']))
+            if context is not None:
+                return context
+        
+        # Samtidiga läsningar av samma fil (t.ex. /tree och /node direkt efter en ny release) delas
+        return self._build_flight.do(('hierarchy', cache_key, tuple(source['diagrams_sig'])),
+                                     lambda: self._read_hierarchy_context(cache_key, source))
+    
+    def _read_hierarchy_context(self, cache_key: str, source: Dict) -> Dict:
+        diagrams_json = self._mirrored_path(source['folder'], source['diagrams_json'].name,
+                                            source['diagrams_json'], source['diagrams_sig'])
+        hierarchy = load_hierarchy(diagrams_json)
+        
+        # Hitta root (parent == 0)
+        root_node = next((node for node in hierarchy if node.get('parent') == 0), None)
+        
+        if not root_node:
+            raise ValueError("Root-nod inte hittad i diagrams_1.json")
+        
+        # Bygg lookup-tabeller
+        context = {
+            'sig': source['diagrams_sig'],
+            'hierarchy': hierarchy,
+            'root': root_node,
+            'nodes_by_hid': {node['hid']: node for node in hierarchy},
+            'nodes_by_sid': {node['sid']: node for node in hierarchy if 'sid' in node},
+            'nodes_by_fullname': {node['fullname']: node for node in hierarchy if 'fullname' in node}
+        }
+        self.hierarchy_cache.put(cache_key, context, tuple(source['diagrams_sig']))
+        return context
+    
+    def read_hierarchy(self, product: str, version: str):
+        """Returnerar diagrams_1.json-listan utan att fylla hierarkicachen (för indexering)"""
+        source = self._version_source(product, version)
+        if "error" in source:
+            return None
+        
+        context = self.hierarchy_cache.peek(f"{product}:{version}")
+        if context is not None and context['sig'] == source['diagrams_sig']:
+            return context['hierarchy']
+        
+        diagrams_json = self._mirrored_path(source['folder'], source['diagrams_json'].name,
+                                            source['diagrams_json'], source['diagrams_sig'])
+        return load_hierarchy(diagrams_json)
+    
+    def get_thumbnail_bundle(self, product: str, version: str, hid: int = None):
+        """Returnerar (bunt, signatur) med thumbnails för hela versionen eller delträdet under hid
+        
+        Bunten byggs vid första anropet och cachas per (diagrams_1.json-signatur,
+        katalog-mtime), så den försvinner med releasen. Bilderna läses samtidigt.
+        """
+        source = self._version_source(product, version)
+        if "error" in source:
+            return source
         
         try:
-            with open(diagrams_json, 'r', encoding='utf-8') as f:
-                hierarchy = json.load(f)
-            
-            # Hitta root (parent == 0)
-            root_node = next((node for node in hierarchy if node.get('parent') == 0), None)
-            
-            if not root_node:
-                return {"error": "Root-nod inte hittad i diagrams_1.json"}
-            
-            # Bygg lookup-tabeller
-            nodes_by_hid = {node['hid']: node for node in hierarchy}
-            nodes_by_sid = {node['sid']: node for node in hierarchy if 'sid' in node}
-            
-            print(f"📊 Totalt {len(nodes_by_hid)} noder i hierarkin")
-            print(f"🎯 Root: {root_node.get('name')} (hid:{root_node.get('hid')})\n")
+            stamp = (tuple(source['diagrams_sig']), os.stat(source['webview_path']).st_mtime_ns)
+        except OSError as e:
+            return {"error": str(e)}
+        
+        cache_key = f"{product}:{version}:thumbnails:{hid if hid is not None else ''}"
+        bundle = self.artifact_cache.get(cache_key, stamp)
+        if bundle is None:
+            bundle = self._build_flight.do(('thumbnails', cache_key, stamp),
+                                           lambda: self._build_thumbnail_bundle(product, version, hid, source))
+            if isinstance(bundle, dict):
+                return bundle
+            self.artifact_cache.put(cache_key, bundle, stamp, size=len(bundle))
+        return bundle, stamp
+    
+    def _build_thumbnail_bundle(self, product: str, version: str, hid: int, source: Dict):
+        try:
+            context = self._load_hierarchy(f"{product}:{version}", source)
+        except Exception as e:
+            return {"error": str(e)}
+        
+        nodes_by_hid = context['nodes_by_hid']
+        top = nodes_by_hid.get(hid) if hid is not None else context['root']
+        if top is None:
+            return {"error": "Nod inte hittad"}
+        
+        # Delträdet i förordning, med skydd mot cykler i children
+        nodes = []
+        seen = set()
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if node['hid'] in seen:
+                continue
+            seen.add(node['hid'])
+            name = thumbnail_file(node)
+            if name:
+                nodes.append((node['hid'], name))
+            stack.extend(nodes_by_hid[child] for child in reversed(node.get('children', []))
+                         if child in nodes_by_hid)
+        
+        webview_path = source['webview_path']
+        names = sorted({name for _, name in nodes if name in source['files']})
+        
+        def read(name: str):
+            try:
+                with open(webview_path / name, 'rb') as f:
+                    return f.read()
+            except OSError:
+                return None
+        
+        contents = self._io_pool.map(read, names) if self._io_pool is not None else map(read, names)
+        blobs = {name: data for name, data in zip(names, contents) if data is not None}
+        metrics.inc('thumbnail_bundles')
+        return pack_bundle({"product": product, "version": version, "hid": top['hid']}, nodes, blobs)
+    
+    def diff_versions(self, product: str, old_version: str, new_version: str) -> Dict:
+        """Jämför två versioner: tillagda/borttagna/flyttade subsystem och ändrade diagram
+        
+        Resultatet cachas per (diagrams_1.json-signatur, katalog-mtime) för båda
+        versionerna, och filhasharna återanvänds mellan jämförelser.
+        """
+        sources = []
+        for version in (old_version, new_version):
+            source = self._version_source(product, version)
+            if "error" in source:
+                return {"error": f"{source['error']}: {version}"}
+            sources.append(source)
+        
+        try:
+            stamps = tuple((tuple(source['diagrams_sig']), os.stat(source['webview_path']).st_mtime_ns)
+                           for source in sources)
+        except OSError as e:
+            return {"error": str(e)}
+        
+        cache_key = f"{product}:{old_version}..{new_version}:diff"
+        result = self.artifact_cache.get(cache_key, stamps)
+        if result is not None:
+            return result
+        
+        return self._build_flight.do(('diff', cache_key, stamps),
+                                     lambda: self._diff_sources(product, old_version, new_version, sources, stamps))
+    
+    def _diff_sources(self, product: str, old_version: str, new_version: str, sources: List[Dict], stamps) -> Dict:
+        cache_key = f"{product}:{old_version}..{new_version}:diff"
+        def load(version: str, source: Dict, stamp) -> Tuple[List[Dict], Dict[str, str]]:
+            context = self._load_hierarchy(f"{product}:{version}", source)
+            names = [name for node in context['hierarchy'] for name in diagram_files(node, product)
+                     if name in source['files']]
+            return context['hierarchy'], self.content_hasher.version_hashes(
+                f"{product}:{version}", source['webview_path'], names, stamp)
+        
+        try:
+            jobs = ((old_version, new_version), sources, stamps)
+            if self._io_pool is not None:
+                # Båda versionerna läses samtidigt
+                loaded = list(self._io_pool.map(load, *jobs))
+            else:
+                loaded = list(map(load, *jobs))
+            hierarchies = [hierarchy for hierarchy, _ in loaded]
+            hashes = [version_hashes for _, version_hashes in loaded]
+        except Exception as e:
+            logger.exception("❌ Fel vid jämförelse av %s v%s och v%s: %s", product, old_version, new_version, e)
+            return {"error": str(e)}
+        
+        result = {"product": product, "from": old_version, "to": new_version}
+        result.update(diff_hierarchies(product, hierarchies[0], hierarchies[1], hashes[0], hashes[1]))
+        self.artifact_cache.put(cache_key, result, stamps)
+        return result
+    
+    def _mirrored_path(self, folder: str, name: str, source_path: Path, source_sig: Tuple[int, int] = None) -> Path:
+        """Returnerar lokal speglad kopia om den finns, annars källan (och fyller spegeln i bakgrunden)"""
+        if self.mirror is None:
+            return source_path
+        
+        local = self.mirror.lookup(folder, name, source_sig)
+        if local is not None:
+            return local
+        
+        self.mirror.schedule_fill(folder, name, source_path)
+        return source_path
+    
+    def _find_node_by_path(self, context: Dict, path: str):
+        """Hittar nod via fullname, med eller utan root-namnet först"""
+        path = path.strip('/')
+        nodes_by_fullname = context['nodes_by_fullname']
+        root_name = context['root'].get('name', '')
+        
+        if path in ('', root_name):
+            return context['root']
+        return nodes_by_fullname.get(path) or nodes_by_fullname.get(f"{root_name}/{path}")
+    
+    def _load_indexed_tree(self, product: str, version: str, webview_path: Path, diagrams_sig: Tuple[int, int]):
+        """Returnerar indexerat träd om diagrams_1.json, externa hierarkier och probade SVG:er är oförändrade"""
+        try:
+            entry = self.tree_index.get(product, version)
+            if entry is None:
+                return None
+            if (entry['diagrams_size'], entry['diagrams_mtime_ns']) != tuple(diagrams_sig):
+                return None
             
-            # Bygg träd rekursivt från root
-            tree = self._build_tree_node(webview_path, product, root_node, nodes_by_hid, nodes_by_sid, level=0)
+            tree = json.loads(entry['tree'])
+            if [list(e) for e in self._external_signature(webview_path, tree)] != entry['externals']:
+                return None
             
-            self.tree_cache[cache_key] = tree
-            print(f"\n✅ Träd byggt och cachat för {product} v{version}")
+            dir_mtime_ns = os.stat(webview_path).st_mtime_ns
+            if entry['dir_mtime_ns'] != dir_mtime_ns:
+                # Katalogen har ändrats - kolla om någon av de probade filerna påverkats
+                results = self._probe_files(webview_path, entry['probes'])
+                if probe_digest(results) != entry['probe_digest']:
+                    return None
+                self.tree_index.touch_dir_mtime(product, version, dir_mtime_ns)
             
             return tree
-            
         except Exception as e:
-            print(f"❌ Fel vid läsning av diagrams_1.json: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"error": str(e)}
+            logger.warning("⚠️  Kunde inte läsa trädindex för %s v%s: %s", product, version, e)
+            return None
+    
+    def _store_indexed_tree(self, product: str, version: str, webview_path: Path,
+                            diagrams_sig: Tuple[int, int], hierarchy: List[Dict], tree: Dict,
+                            externals: List[Tuple] = ()) -> None:
+        """Sparar byggt träd i det persistenta indexet"""
+        try:
+            dir_mtime_ns = os.stat(webview_path).st_mtime_ns
+            results = self._probe_files(webview_path, self._collect_probe_names(hierarchy))
+            self.tree_index.put(product, version, diagrams_sig, dir_mtime_ns, results, tree, externals)
+        except Exception as e:
+            logger.warning("⚠️  Kunde inte spara trädindex för %s v%s: %s", product, version, e)
+    
+    def _collect_probe_names(self, hierarchy: List[Dict]) -> List[str]:
+        """Samlar alla filnamn som trädbygget kontrollerar existensen av"""
+        names = set()
+        for node in hierarchy:
+            for element in node.get('elements', []):
+                element_icon = element.get('icon')
+                if element_icon not in ['SubSystemIcon_icon', 'MdlRefBlockIcon_icon']:
+                    continue
+                element_sid = element.get('sid') or ''
+                if ':' not in element_sid:
+                    continue
+                product_prefix, sid_number = element_sid.split(':')[:2]
+                names.add(f"{product_prefix}_{sid_number}_d.svg")
+                if element_icon == 'MdlRefBlockIcon_icon':
+                    names.add(f"{element.get('name')}_diagrams_1.json")
+        return sorted(names)
+    
+    def _probe_files(self, webview_path: Path, names: List[str]) -> Dict[str, bool]:
+        """Kontrollerar vilka av de givna filerna som finns"""
+        files = self.manifests.get(webview_path)
+        return {name: name in files for name in names}
     
-    def _build_tree_node(self, webview_path: Path, product: str, node: Dict, nodes_by_hid: Dict, nodes_by_sid: Dict, level: int) -> Dict:
-        """Bygger träd-nod från diagrams_1.json med korrekt klickbarhetslogik"""
+    def _build_tree_node(self, webview_path: Path, product: str, node: Dict, nodes_by_hid: Dict, nodes_by_sid: Dict,
+                         files: Manifest, level: int, max_depth: int = None) -> Dict:
+        """Bygger träd-nod från diagrams_1.json med korrekt klickbarhetslogik
+        
+        Med `max_depth` satt byggs barn bara så många nivåer ned, därefter
+        returneras stubbar som kan expanderas via /node/<hid>.
+        """
         
         # Extrahera filnamn från node
         svg_path = node.get('svg', '')
@@ -145,14 +1044,18 @@ class SimulinkFileScanner:
             "clickable_elements": []
         }
         
+        # Loggning på DEBUG-nivå kostar bara en flagga per nod när den är avstängd
+        debug = logger.isEnabledFor(logging.DEBUG)
         indent = '  ' * level
-        print(f"{indent}📄 {node.get('name')} (hid:{node.get('hid')})")
+        probes = 0
         
         # Hämta elements och children
         elements = node.get('elements', [])
         children_hids = node.get('children', [])
         
-        print(f"{indent}   Elements: {len(elements)}, Children HIDs: {children_hids}")
+        if debug:
+            logger.debug("%s📄 %s (hid:%s) elements: %d, children: %s",
+                         indent, node.get('name'), node.get('hid'), len(elements), children_hids)
         
         # KORREKT LOGIK: Gå igenom elements array och hitta klickbara
         for element in elements:
@@ -173,10 +1076,9 @@ class SimulinkFileScanner:
             else:
                 continue
             
-            # Kolla om SVG-filen finns
-            svg_file_path = webview_path / expected_svg
-            
-            if svg_file_path.exists():
+            # Kolla om SVG-filen finns (via katalogmanifestet)
+            probes += 1
+            if expected_svg in files:
                 # KLICKBAR!
                 clickable = {
                     'sid': element_sid,
@@ -195,40 +1097,60 @@ class SimulinkFileScanner:
                     clickable['hid'] = child_node['hid']
                     clickable['has_children'] = True
                     clickable['hierarchy_type'] = 'internal'
-                    print(f"{indent}   ✅ {element_name} → {expected_svg} (SubSystem, hid:{child_node['hid']})")
+                    if debug:
+                        logger.debug("%s   ✅ %s → %s (SubSystem, hid:%s)", indent, element_name, expected_svg, child_node['hid'])
                 elif element_icon == 'MdlRefBlockIcon_icon':
                     # ModelReference → kolla om det finns en extern hierarki
-                    external_diagrams = webview_path / f"{element_name}_diagrams_1.json"
+                    external_diagrams = f"{element_name}_diagrams_1.json"
                     
-                    if external_diagrams.exists():
+                    probes += 1
+                    if external_diagrams in files:
                         # ModelRef med egen hierarki!
                         clickable['hid'] = None
                         clickable['has_children'] = True
                         clickable['hierarchy_type'] = 'external'
                         clickable['external_hierarchy'] = f"{element_name}_diagrams_1.json"
-                        print(f"{indent}   ✅ {element_name} → {expected_svg} (ModelRef med egen hierarki: {element_name}_diagrams_1.json)")
+                        if debug:
+                            logger.debug("%s   ✅ %s → %s (ModelRef med egen hierarki: %s)",
+                                         indent, element_name, expected_svg, external_diagrams)
                     else:
                         # ModelRef utan barn (leaf node)
                         clickable['hid'] = None
                         clickable['has_children'] = False
                         clickable['hierarchy_type'] = 'leaf'
-                        print(f"{indent}   ✅ {element_name} → {expected_svg} (ModelRef, leaf node)")
+                        if debug:
+                            logger.debug("%s   ✅ %s → %s (ModelRef, leaf node)", indent, element_name, expected_svg)
                 else:
                     # SubSystem utan barn i hierarkin (leaf node)
                     clickable['hid'] = None
                     clickable['has_children'] = False
                     clickable['hierarchy_type'] = 'leaf'
-                    print(f"{indent}   ✅ {element_name} → {expected_svg} (SubSystem, leaf node)")
+                    if debug:
+                        logger.debug("%s   ✅ %s → %s (SubSystem, leaf node)", indent, element_name, expected_svg)
                 
                 tree_node['clickable_elements'].append(clickable)
-            else:
-                print(f"{indent}   ⏭️  {element_name} (SVG finns ej: {expected_svg})")
+            elif debug:
+                logger.debug("%s   ⏭️  %s (SVG finns ej: %s)", indent, element_name, expected_svg)
+        
+        metrics.inc('file_probes', probes)
         
         # Bygg barn-träd ENDAST för SubSystems som finns i hierarkin
         for child_hid in children_hids:
             child_node = nodes_by_hid.get(child_hid)
             if not child_node:
-                print(f"{indent}   ⚠️  Child hid:{child_hid} inte hittad i hierarkin")
+                logger.warning("%s   ⚠️  Child hid:%s inte hittad i hierarkin", indent, child_hid)
+                continue
+            
+            if max_depth is not None and max_depth <= 0:
+                tree_node['children'].append({
+                    "name": child_node.get('name'),
+                    "label": child_node.get('label', child_node.get('name')),
+                    "hid": child_node.get('hid'),
+                    "sid": child_node.get('sid'),
+                    "level": level + 1,
+                    "stub": True,
+                    "has_children": bool(child_node.get('children'))
+                })
                 continue
             
             # Bygg barn-nod rekursivt
@@ -238,22 +1160,34 @@ class SimulinkFileScanner:
                 child_node,
                 nodes_by_hid,
                 nodes_by_sid,
-                level + 1
+                files,
+                level + 1,
+                max_depth=None if max_depth is None else max_depth - 1
             )
             tree_node['children'].append(child_tree)
         
         return tree_node
     
-    def _build_child_node_from_json(self, webview_path: Path, product: str, hierarchy_node: Dict, level: int) -> Dict:
-        """Steg 2: Bygger barn-nod från *_d.json och letar efter .slx i inspector.values"""
+    def _build_child_node_from_json(self, webview_path: Path, product: str, hierarchy_node: Dict, level: int,
+                                    graph: Dict = None) -> Dict:
+        """Steg 2: Bygger barn-nod från *_d.json och letar efter .slx i inspector.values
+        
+        .slx-referenserna byggs som en memoiserad graf: varje *_d.json parsas
+        högst en gång per bygge (`graph` delas mellan anropen), en modell som
+        nås från flera föräldrar expanderas första gången och returneras
+        därefter som referens (`ref`), och cykler bryts och listas i
+        `slx_cycles` på noden som startade bygget.
+        """
+        owns_graph = graph is None
+        if owns_graph:
+            graph = self._new_slx_graph()
+        
         svg_path = hierarchy_node.get('svg', '')
         svg_filename = svg_path.split('/')[-1] if svg_path else ''
         
         sys_view_url = hierarchy_node.get('sysViewURL', '')
         json_filename = sys_view_url.split('/')[-1] if sys_view_url else ''
         
-        json_path = webview_path / json_filename
-        
         tree_node = {
             "name": hierarchy_node.get('name'),
             "label": hierarchy_node.get('label', hierarchy_node.get('name')),
@@ -270,58 +1204,61 @@ class SimulinkFileScanner:
             "clickable_elements": []
         }
         
-        if json_path.exists():
-            print(f"{'  ' * level}🔍 Läser: {json_filename}")
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    json_data = json.load(f)
-                
-                # Steg 2: Leta efter .slx i inspector.values
-                slx_files = self._extract_slx_from_values(json_data, level)
-                
-                print(f"{'  ' * level}🔢 Hittade {len(slx_files)} .slx filer")
-                
-                # För varje .slx, gå till steg 3
-                for slx_info in slx_files:
-                    slx_file = slx_info['slx']
-                    base_name = slx_file.replace('.slx', '')
-                    label = slx_info.get('label', base_name)
-                    
-                    slx_svg = f"{base_name}_d.svg"
-                    slx_json = f"{base_name}_d.json"
-                    
-                    if (webview_path / slx_svg).exists():
-                        print(f"{'  ' * level}  ✅ Klickbar: {label} → {base_name}_d")
-                        
-                        clickable = {
-                            'name': base_name,
-                            'label': label,
-                            'svg': slx_svg,
-                            'json': slx_json
-                        }
-                        tree_node['clickable_elements'].append(clickable)
-                        
-                        # Steg 3: Bygg barn-nod rekursivt
-                        child_tree = self._build_slx_child_node(
-                            webview_path, 
-                            product, 
-                            base_name,
-                            label,
-                            level + 1
-                        )
-                        tree_node['children'].append(child_tree)
-                    else:
-                        print(f"{'  ' * level}  ⏭️  {slx_file} → {slx_svg} finns inte")
-                    
-            except Exception as e:
-                print(f"{'  ' * level}  ❌ Fel vid läsning av {json_filename}: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            print(f"{'  ' * level}  ⚠️  JSON finns inte: {json_filename}")
+        # Steg 2 och 3: följ varje klickbar .slx rekursivt
+        for base_name, label in self._slx_references(webview_path, json_filename, level, graph):
+            tree_node['clickable_elements'].append(self._slx_clickable(base_name, label))
+            tree_node['children'].append(
+                self._build_slx_child_node(webview_path, product, base_name, label, level + 1, graph)
+            )
         
+        if owns_graph and graph['cycles']:
+            tree_node['slx_cycles'] = graph['cycles']
         return tree_node
     
+    def _new_slx_graph(self) -> Dict:
+        """Delat tillstånd för ett .slx-bygge: parsade referenser, expanderade modeller och cykler"""
+        return {'references': {}, 'expanded': set(), 'cycles': []}
+    
+    def _slx_references(self, webview_path: Path, json_filename: str, level: int, graph: Dict) -> List[Tuple[str, str]]:
+        """Returnerar klickbara (basnamn, label) från en *_d.json - parsas högst en gång per bygge"""
+        references = graph['references'].get(json_filename)
+        if references is not None:
+            return references
+        
+        references = []
+        graph['references'][json_filename] = references
+        
+        if not json_filename or not self.manifests.exists(webview_path, json_filename):
+            logger.debug("%s  ⚠️  JSON finns inte: %s", '  ' * level, json_filename)
+            return references
+        
+        logger.debug("%s🔍 Läser: %s", '  ' * level, json_filename)
+        try:
+            with open(webview_path / json_filename, 'r', encoding='utf-8') as f:
+                json_data = json.load(f)
+            metrics.inc('slx_json_parses')
+        except Exception as e:
+            logger.warning("%s  ❌ Fel vid läsning av %s: %s", '  ' * level, json_filename, e)
+            return references
+        
+        for slx_info in self._extract_slx_from_values(json_data, level):
+            base_name = slx_info['slx'].replace('.slx', '')
+            if self.manifests.exists(webview_path, f"{base_name}_d.svg"):
+                references.append((base_name, slx_info.get('label', base_name)))
+            else:
+                logger.debug("%s  ⏭️  %s → %s_d.svg finns inte", '  ' * level, slx_info['slx'], base_name)
+        
+        logger.debug("%s🔢 %s: %d klickbara .slx", '  ' * level, json_filename, len(references))
+        return references
+    
+    def _slx_clickable(self, base_name: str, label: str) -> Dict:
+        return {
+            'name': base_name,
+            'label': label,
+            'svg': f"{base_name}_d.svg",
+            'json': f"{base_name}_d.json"
+        }
+    
     def _extract_slx_from_values(self, json_data, level: int) -> List[Dict]:
         """Extraherar alla .slx filer från inspector.values array i JSON"""
         slx_files = []
@@ -329,11 +1266,14 @@ class SimulinkFileScanner:
         # JSON kan vara en lista eller ett objekt
         items_to_check = json_data if isinstance(json_data, list) else [json_data]
         
-        print(f"{'  ' * level}📋 Går igenom {len(items_to_check)} objekt")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("%s📋 Går igenom %d objekt", '  ' * level, len(items_to_check))
         
         for item in items_to_check:
             if not isinstance(item, dict):
-                print(f"{'  ' * level}  ⏭️ Skippar (inte dict)")
+                if debug:
+                    logger.debug("%s  ⏭️ Skippar (inte dict)", '  ' * level)
                 continue
             
             # VIKTIGT: Leta i "inspector" -> "values"
@@ -345,7 +1285,8 @@ class SimulinkFileScanner:
             if not isinstance(values, list) or len(values) == 0:
                 continue
             
-            print(f"{'  ' * level}  🔎 Kollar inspector.values ({len(values)} items)")
+            if debug:
+                logger.debug("%s  🔎 Kollar inspector.values (%d items)", '  ' * level, len(values))
             
             # Hitta första .slx i values
             for idx, val in enumerate(values):
@@ -359,16 +1300,26 @@ class SimulinkFileScanner:
                         'slx': val,
                         'label': label
                     })
-                    print(f"{'  ' * level}    ✅ Hittade .slx vid index {idx}: {val}")
+                    if debug:
+                        logger.debug("%s    ✅ Hittade .slx vid index %d: %s", '  ' * level, idx, val)
                     break  # Ta bara första .slx per objekt
         
         return slx_files
     
-    def _build_slx_child_node(self, webview_path: Path, product: str, base_name: str, label: str, level: int) -> Dict:
-        """Steg 3: Bygger nod för en .slx-fil och fortsätter rekursivt"""
+    def _build_slx_child_node(self, webview_path: Path, product: str, base_name: str, label: str, level: int,
+                              graph: Dict = None, chain: Tuple[str, ...] = ()) -> Dict:
+        """Steg 3: Bygger nod för en .slx-fil och fortsätter rekursivt
+        
+        `chain` är modellerna på vägen hit; en modell som redan finns där är
+        en cykel och följs inte. En modell som redan expanderats i samma bygge
+        returneras som referens utan barn.
+        """
+        owns_graph = graph is None
+        if owns_graph:
+            graph = self._new_slx_graph()
+        
         svg_filename = f"{base_name}_d.svg"
         json_filename = f"{base_name}_d.json"
-        json_path = webview_path / json_filename
         
         tree_node = {
             "name": base_name,
@@ -384,66 +1335,102 @@ class SimulinkFileScanner:
             "clickable_elements": []
         }
         
-        # Steg 3: Läs JSON och leta efter fler .slx filer
-        if json_path.exists():
-            print(f"{'  ' * level}🔍 Läser: {json_filename}")
-            try:
-                with open(json_path, 'r', encoding='utf-8') as f:
-                    json_data = json.load(f)
-                
-                # Leta efter .slx i inspector.values
-                slx_files = self._extract_slx_from_values(json_data, level)
-                
-                print(f"{'  ' * level}📄 {base_name}: Hittade {len(slx_files)} .slx filer")
-                
-                # Fortsätt rekursivt för varje .slx
-                for slx_info in slx_files:
-                    child_slx = slx_info['slx']
-                    child_base = child_slx.replace('.slx', '')
-                    child_label = slx_info.get('label', child_base)
-                    child_svg = f"{child_base}_d.svg"
-                    child_json = f"{child_base}_d.json"
-                    
-                    if (webview_path / child_svg).exists():
-                        print(f"{'  ' * level}  ✅ Klickbar: {child_label}")
-                        
-                        clickable = {
-                            'name': child_base,
-                            'label': child_label,
-                            'svg': child_svg,
-                            'json': child_json
-                        }
-                        tree_node['clickable_elements'].append(clickable)
-                        
-                        # Fortsätt rekursivt
-                        grandchild = self._build_slx_child_node(
-                            webview_path, 
-                            product, 
-                            child_base,
-                            child_label,
-                            level + 1
-                        )
-                        tree_node['children'].append(grandchild)
-            except Exception as e:
-                print(f"{'  ' * level}  ❌ Fel: {e}")
+        if base_name in chain:
+            cycle = list(chain[chain.index(base_name):]) + [base_name]
+            graph['cycles'].append(cycle)
+            logger.info("%s🔁 Cykel i .slx-referenser: %s", '  ' * level, " → ".join(cycle))
+            tree_node['ref'] = base_name
+            tree_node['cycle'] = True
+            return tree_node
+        
+        if base_name in graph['expanded']:
+            # Delat delträd - redan emitterat tidigare i samma bygge
+            tree_node['ref'] = base_name
+            return tree_node
+        graph['expanded'].add(base_name)
+        
+        # Leta efter .slx i inspector.values och fortsätt rekursivt
+        for child_base, child_label in self._slx_references(webview_path, json_filename, level, graph):
+            tree_node['clickable_elements'].append(self._slx_clickable(child_base, child_label))
+            tree_node['children'].append(
+                self._build_slx_child_node(webview_path, product, child_base, child_label, level + 1,
+                                           graph, chain + (base_name,))
+            )
         
+        if owns_graph and graph['cycles']:
+            tree_node['slx_cycles'] = graph['cycles']
         return tree_node
     
-    def get_file_content(self, product: str, version: str, filename: str, file_type: str = 'svg') -> Tuple[bool, any]:
-        """Hämtar innehållet i en fil"""
-        if product not in self.products:
+    def version_folder(self, product: str, version: str):
+        """Returnerar releasemappens namn för en version, eller None"""
+        version_data = next((v for v in self.products.get(product, []) if v['version'] == version), None)
+        return version_data['folder'] if version_data else None
+    
+    def version_source(self, product: str, version: str) -> Dict:
+        """Returnerar versionens folder, webview_path, diagrams_json och diagrams_sig, eller {"error": ...}"""
+        source = self._version_source(product, version)
+        if "error" in source:
+            return source
+        return {key: source[key] for key in ('folder', 'webview_path', 'diagrams_json', 'diagrams_sig')}
+    
+    def snapshot_for(self, product: str, version: str):
+        """Returnerar versionens kompilerade snapshot (ReleaseSnapshot), eller None"""
+        if self.snapshots is None:
+            return None
+        folder = self.version_folder(product, version)
+        return self.snapshots.get(folder) if folder else None
+    
+    def resolve_file(self, product: str, version: str, filename: str) -> Tuple[bool, any]:
+        """Slår upp sökvägen till en fil i versionens slwebview_files-katalog"""
+        versions = self.products.get(product)
+        if versions is None:
             return False, "Produkt inte hittad"
         
-        version_data = next((v for v in self.products[product] if v['version'] == version), None)
+        version_data = next((v for v in versions if v['version'] == version), None)
         if not version_data:
             return False, "Version inte hittad"
         
+        if not safe_relative_name(filename):
+            return False, f"Ogiltigt filnamn: {filename}"
+        
         webview_path = Path(version_data['webview_path'])
         file_path = webview_path / filename
+        files = self.manifests.listing(file_path.parent)
+        
+        if files is None:
+            # Nätverksresursen nås inte - en tidigare speglad kopia är bättre än inget svar
+            local = self.mirror.lookup(version_data['folder'], filename) if self.mirror is not None else None
+            if local is not None:
+                return True, local
+            return False, f"Fil inte hittad: {filename}"
         
-        if not file_path.exists():
+        if file_path.name not in files:
             return False, f"Fil inte hittad: {filename}"
         
+        if self.mirror is not None:
+            # Den speglade kopian gäller bara så länge källfilen har samma storlek/mtime
+            try:
+                source_sig = self.manifests.signature(file_path)
+            except FileNotFoundError:
+                return False, f"Fil inte hittad: {filename}"
+            except OSError:
+                source_sig = None
+            local = self.mirror.lookup(version_data['folder'], filename, source_sig)
+            if local is not None:
+                return True, local
+        
+        metrics.inc('file_probes')
+        if self.mirror is not None:
+            self.mirror.schedule_fill(version_data['folder'], filename, file_path)
+        
+        return True, file_path
+    
+    def get_file_content(self, product: str, version: str, filename: str, file_type: str = 'svg') -> Tuple[bool, any]:
+        """Hämtar innehållet i en fil"""
+        success, file_path = self.resolve_file(product, version, filename)
+        if not success:
+            return False, file_path
+        
         try:
             if file_type == 'json':
                 with open(file_path, 'r', encoding='utf-8') as f:
@@ -457,13 +1444,51 @@ class SimulinkFileScanner:
             return False, str(e)
 
 
-scanner = SimulinkFileScanner(str(NETWORK_PATH))
+tree_index = TreeIndex(TREE_INDEX_PATH) if TREE_INDEX_PATH else None
+snapshot_store = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+shared_cache = SharedCache(SHARED_CACHE_PATH, lease_ttl=SHARED_LEASE_TTL) if SHARED_CACHE_PATH else None
+scanner = SimulinkFileScanner(
+    [str(root) for root in RELEASE_ROOTS],
+    tree_index=tree_index,
+    manifest_ttl=MANIFEST_TTL,
+    mirror=ReleaseMirror(MIRROR_DIR, MIRROR_MAX_MB * 1024 * 1024) if MIRROR_DIR else None,
+    tree_cache=TreeCache(TREE_CACHE_MAX_ENTRIES, TREE_CACHE_MAX_MB * 1024 * 1024),
+    hierarchy_cache=TreeCache(HIERARCHY_CACHE_MAX_ENTRIES, TREE_CACHE_MAX_MB * 1024 * 1024),
+    artifact_cache=TreeCache(ARTIFACT_CACHE_MAX_ENTRIES, ARTIFACT_CACHE_MAX_MB * 1024 * 1024),
+    content_hasher=ContentHasher(tree_index, workers=HASH_WORKERS),
+    build_concurrency=BUILD_CONCURRENCY,
+    negative_ttl=NEGATIVE_CACHE_TTL,
+    root_timeout=ROOT_SCAN_TIMEOUT,
+    snapshots=snapshot_store,
+    shared_cache=shared_cache
+)
+if shared_cache is not None:
+    # Delade träd för versioner som inte längre finns tas bort
+    scanner.scan_listeners.append(lambda products: shared_cache.prune(
+        'tree:', [f"tree:{product}:{v['version']}" for product, versions in products.items() for v in versions]))
+if snapshot_store is not None:
+    scanner.scan_listeners.append(snapshot_store.on_scan)
+prewarmer = TreePrewarmer(scanner, latest=PREWARM_LATEST, workers=PREWARM_WORKERS)
+scanner.scan_listeners.append(prewarmer.schedule)
+search_index = SearchIndex()
+search_indexer = SearchIndexer(scanner, search_index)
+scanner.scan_listeners.append(search_indexer.on_scan)
+file_prefetcher = FilePrefetcher(scanner, FILE_PREFETCH_MB * 1024 * 1024, workers=FILE_PREFETCH_WORKERS)
+scanner.scan_listeners.append(file_prefetcher.on_scan)
+svg_optimizer = (SvgOptimizer(SVG_OPTIMIZE_DIR, SVG_OPTIMIZE_MAX_MB * 1024 * 1024, workers=SVG_OPTIMIZE_WORKERS,
+                              revalidate_after=MANIFEST_TTL) if SVG_OPTIMIZE_DIR else None)
+if svg_optimizer is not None:
+    scanner.scan_listeners.append(svg_optimizer.on_scan)
 
 
 @app.route('/api/products')
 def get_products():
-    """Returnerar lista över alla unika produkter"""
-    products = scanner.scan_products()
+    """Returnerar lista över alla unika produkter, med hälsa per releaserot
+    
+    `partial` är sant när någon rot inte kunde skannas; dess produkter
+    kommer då från senast lyckade skanning (eller saknas).
+    """
+    products = scanner.ensure_scanned()
     
     if "error" in products:
         return jsonify(products), 500
@@ -476,22 +1501,22 @@ def get_products():
             "latest_version": versions[0]['version'] if versions else None
         })
     
+    roots = scanner.root_status()
     return jsonify({
         "count": len(product_list),
-        "products": sorted(product_list, key=lambda x: x['name'])
+        "products": sorted(product_list, key=lambda x: x['name']),
+        "partial": any(root['status'] != 'ok' for root in roots),
+        "roots": roots
     })
 
 
 @app.route('/api/product/<product>/versions')
 def get_product_versions(product: str):
     """Returnerar alla versioner för en specifik produkt"""
-    if product not in scanner.products:
-        scanner.scan_products()
-    
-    if product not in scanner.products:
+    versions = scanner.ensure_product(product)
+    if versions is None:
         return jsonify({"error": "Produkt inte hittad"}), 404
     
-    versions = scanner.products[product]
     version_list = [{
         "version": v['version'],
         "folder": v['folder']
@@ -506,47 +1531,404 @@ def get_product_versions(product: str):
 
 @app.route('/api/product/<product>/version/<version>/tree')
 def get_product_version_tree(product: str, version: str):
-    """Bygger trädet för produkt och version"""
-    if product not in scanner.products:
-        scanner.scan_products()
+    """Bygger trädet för produkt och version
+    
+    Med ?format=compact (eller Accept: application/vnd.lia.tree-compact+json)
+    returneras en platt hid-indexerad tabell med internerade strängar.
+    """
+    scanner.ensure_product(product, version)
     
     tree = scanner.build_tree_from_root(product, version)
     
     if "error" in tree:
         return jsonify(tree), 404
     
+    if request.args.get('format') == 'compact' or COMPACT_MIMETYPE in request.headers.get('Accept', ''):
+        response = Response(scanner.get_compact_tree_payload(product, version, tree), mimetype='application/json')
+        response.vary.add('Accept')
+        return response
+    
     return jsonify(tree)
 
 
+@app.route('/api/product/<product>/version/<version>/node')
+@app.route('/api/product/<product>/version/<version>/node/<int:hid>')
+def get_product_version_node(product: str, version: str, hid: int = None):
+    """Returnerar en nod (via hid eller ?path=) med barn ned till ?depth= nivåer"""
+    scanner.ensure_product(product, version)
+    
+    try:
+        depth = max(0, int(request.args.get('depth', 1)))
+    except ValueError:
+        return jsonify({"error": "Ogiltigt depth-värde"}), 400
+    
+    node = scanner.get_subtree(product, version, hid=hid, path=request.args.get('path'), depth=depth)
+    
+    if "error" in node:
+        return jsonify(node), 404
+    
+    return jsonify(node)
+
+
+@app.route('/api/product/<product>/version/<version>/thumbnails')
+@app.route('/api/product/<product>/version/<version>/thumbnails/<int:hid>')
+def get_thumbnail_bundle(product: str, version: str, hid: int = None):
+    """Returnerar alla thumbnails för versionen (eller delträdet under hid) i en bunt
+    
+    Svaret börjar med fyra bytes (big-endian) som anger längden på ett
+    JSON-index; därefter följer indexet och bilddatat. Indexets thumbnails
+    mappar hid till [offset, längd, typ] i bilddatat.
+    """
+    scanner.ensure_product(product, version)
+    
+    result = scanner.get_thumbnail_bundle(product, version, hid=hid)
+    if isinstance(result, dict):
+        return jsonify(result), 404
+    
+    bundle, stamp = result
+    response = Response(bundle, mimetype=BUNDLE_MIMETYPE)
+    response.set_etag(f"{zlib.adler32(repr(stamp).encode('utf-8')):x}-{len(bundle):x}")
+    response.make_conditional(request)
+    return _apply_release_caching(response)
+
+
+@app.route('/api/product/<product>/diff')
+def diff_product_versions(product: str):
+    """Jämför två versioner (?from=&to=): tillagda, borttagna, flyttade och ändrade subsystem"""
+    old_version = request.args.get('from')
+    new_version = request.args.get('to')
+    if not old_version or not new_version:
+        return jsonify({"error": "Parametrarna from och to krävs"}), 400
+    
+    scanner.ensure_product(product, old_version)
+    scanner.ensure_product(product, new_version)
+    
+    start = time.perf_counter()
+    result = scanner.diff_versions(product, old_version, new_version)
+    if "error" in result:
+        return jsonify(result), 404
+    
+    return jsonify(dict(result, took_ms=round((time.perf_counter() - start) * 1000, 3)))
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.before_request
+def _start_background_scan():
+    # Startas av första förfrågan i varje process, inte vid import: en process som importerar appen
+    # och sedan forkar (gunicorn --preload) ska inte ha skanningar eller trådar igång vid forken
+    scanner.start_background_scan(SCAN_INTERVAL)
+
+
+@app.after_request
+def _record_request_metrics(response: Response) -> Response:
+    """Latens per route och antal skickade bytes"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        rule = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        metrics.observe(f"route {rule}", elapsed_ms)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s → %d (%.1f ms)", request.method, request.path, response.status_code, elapsed_ms)
+    if response.content_length:
+        metrics.inc('bytes_served', response.content_length)
+    return response
+
+
+def project_json(data, fields: List[str]):
+    """Behåller bara angivna fält per element (punktnotation för nästlade fält, t.ex. inspector.values)"""
+    def pick(item):
+        if not isinstance(item, dict):
+            return item
+        result = {}
+        for field in fields:
+            value = item
+            for part in field.split('.'):
+                if not isinstance(value, dict) or part not in value:
+                    break
+                value = value[part]
+            else:
+                result[field] = value
+        return result
+    
+    if isinstance(data, list):
+        return [pick(item) for item in data]
+    return pick(data)
+
+
+def _apply_release_caching(response: Response) -> Response:
+    """Releasemappar ändras aldrig efter publicering - låt klienter cacha länge"""
+    response.cache_control.public = True
+    response.cache_control.max_age = FILE_CACHE_MAX_AGE
+    if FILE_CACHE_MAX_AGE > 0:
+        response.cache_control.immutable = True
+    return response
+
+
 @app.route('/api/product/<product>/version/<version>/file/<path:filepath>')
 def serve_product_file(product: str, version: str, filepath: str):
-    """Serverar SVG eller JSON fil"""
+    """Serverar SVG eller JSON fil med ETag/Last-Modified och villkorliga svar
+    
+    JSON skickas som råa bytes; med ?fields=sid,name,icon returneras bara de
+    fälten per element. Kompilerade versioner serveras direkt ur snapshoten.
+    Efter en SVG köas dess klickbara barn för förhämtning,
+    så att nästa dubbelklick kan serveras ur minnet. SVG:er minifieras en gång
+    i bakgrunden; därefter skickas den förkomprimerade variant som
+    Accept-Encoding tillåter.
+    """
+    if not safe_relative_name(filepath):
+        return jsonify({"error": f"Ogiltigt filnamn: {filepath}"}), 404
+    
     try:
-        file_type = 'json' if filepath.endswith('.json') else 'svg'
-        success, content = scanner.get_file_content(product, version, filepath, file_type)
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+        is_svg = filepath.endswith('.svg') and svg_optimizer is not None
+        folder = scanner.version_folder(product, version) if is_svg else None
+        
+        snapshot = scanner.snapshot_for(product, version)
+        cached = snapshot.file(filepath) if snapshot is not None else None
+        
+        if folder:
+            # Optimerade varianter gäller bara för den källfil (storlek/mtime) de byggdes från
+            if cached is not None:
+                found, source = True, (len(cached[0]), cached[1])
+            else:
+                found, source = scanner.resolve_file(product, version, filepath)
+            response = _serve_optimized_svg(folder, filepath, source) if found else None
+            if response is not None:
+                _prefetch_clickable(product, version, filepath)
+                return _apply_release_caching(response)
+        
+        if cached is None and not fields:
+            cached = file_prefetcher.get(product, version, filepath)
+        
+        if cached is not None and fields and filepath.endswith('.json'):
+            # Projektion direkt ur snapshoten
+            data, mtime_ns = cached
+            response = jsonify(project_json(json.loads(bytes(data)), fields))
+            response.set_etag(f"{mtime_ns:x}-{len(data):x}-{zlib.adler32(','.join(fields).encode('utf-8')):x}")
+            response.last_modified = mtime_ns / 1e9
+            response.make_conditional(request)
+            return _apply_release_caching(response)
+        
+        if cached is not None:
+            data, mtime_ns = cached
+            if folder:
+                svg_optimizer.schedule(folder, filepath, bytes(data), (len(data), mtime_ns))
+            # Snapshotens skiva strömmas i block direkt ur mmap, utan att hela filen kopieras hit
+            response = Response(iter_bytes(data), mimetype=_file_mimetype(filepath))
+            response.content_length = len(data)
+            response.set_etag(f"{mtime_ns:x}-{len(data):x}")
+            response.last_modified = mtime_ns / 1e9
+            response.make_conditional(request)
+            _prefetch_clickable(product, version, filepath)
+            return _apply_release_caching(response)
+        
+        success, file_path = scanner.resolve_file(product, version, filepath)
         
         if not success:
-            return jsonify({"error": content}), 404
+            return jsonify({"error": file_path}), 404
         
-        if file_type == 'json':
-            return jsonify(content)
+        if filepath.endswith('.json') and fields:
+            # Projektion: returnera bara efterfrågade nycklar per element
+            st = os.stat(file_path)
+            with open(file_path, 'rb') as f:
+                data = json.load(f)
+            response = jsonify(project_json(data, fields))
+            response.set_etag(f"{st.st_mtime_ns:x}-{st.st_size:x}-{zlib.adler32(','.join(fields).encode('utf-8')):x}")
+            response.last_modified = st.st_mtime
+            response.make_conditional(request)
         else:
-            return Response(content, mimetype='image/svg+xml')
+            # Råa bytes strömmas från disk (wsgi.file_wrapper/sendfile där servern stödjer det)
+            # ETag från mtime/storlek så att speglad kopia och original ger samma validator
+            st = os.stat(file_path)
+            response = send_file(file_path, mimetype=_file_mimetype(filepath), conditional=True,
+                                 etag=f"{st.st_mtime_ns:x}-{st.st_size:x}", max_age=FILE_CACHE_MAX_AGE)
+            if folder:
+                svg_optimizer.schedule(folder, filepath, file_path, (st.st_size, st.st_mtime_ns))
+            _prefetch_clickable(product, version, filepath)
+        
+        return _apply_release_caching(response)
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _serve_optimized_svg(folder: str, filepath: str, source):
+    """Skickar den optimerade variant som Accept-Encoding tillåter, eller None om ingen finns"""
+    variants = svg_optimizer.lookup(folder, filepath, source)
+    if variants is None:
+        return None
+    encoding = choose_encoding(request.headers.get('Accept-Encoding', ''), list(variants))
+    variant = variants[encoding or 'identity']
+    try:
+        st = os.stat(variant)
+    except OSError:
+        # Vräkt av en annan process - originalet serveras i stället
+        return None
+    response = send_file(variant, mimetype='image/svg+xml', conditional=True,
+                         etag=f"{st.st_mtime_ns:x}-{st.st_size:x}", max_age=FILE_CACHE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _file_mimetype(filepath: str):
+    if filepath.endswith('.json'):
+        return 'application/json'
+    if filepath.endswith('.svg'):
+        return 'image/svg+xml'
+    return None
+
+
+def _prefetch_clickable(product: str, version: str, filepath: str) -> None:
+    # Snapshottade versioner ligger redan i minnet
+    if file_prefetcher.enabled and filepath.endswith('.svg') and scanner.snapshot_for(product, version) is None:
+        file_prefetcher.prefetch(product, version, scanner.clickable_svgs(product, version, filepath))
+
+
+@app.route('/api/product/<product>/version/<version>/files', methods=['GET', 'POST'])
+def serve_product_files(product: str, version: str):
+    """Returnerar flera filer ur en version i ett svar
+    
+    Filnamnen anges som ?names=a.svg,b.svg eller som JSON-kropp {"names": [...]}.
+    Innehållet returneras som text per filnamn, så bara SVG- och JSON-filer
+    kan hämtas. Filer som saknas, har en annan typ eller inte är UTF-8 listas
+    under missing med sitt felmeddelande.
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        names = body.get('names') if isinstance(body, dict) else None
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return jsonify({"error": "JSON-kroppen måste innehålla names som en lista av filnamn"}), 400
+    else:
+        names = [name.strip() for name in request.args.get('names', '').split(',')]
+    
+    names = list(dict.fromkeys(name for name in names if name))
+    if not names:
+        return jsonify({"error": "Inga filnamn angivna"}), 400
+    if len(names) > MAX_BATCH_FILES:
+        return jsonify({"error": f"Högst {MAX_BATCH_FILES} filer per anrop"}), 400
+    
+    scanner.ensure_product(product, version)
+    
+    files = {}
+    missing = {}
+    for name in names:
+        if not name.lower().endswith(BATCH_TEXT_SUFFIXES):
+            missing[name] = f"Endast textfiler ({', '.join(BATCH_TEXT_SUFFIXES)}) kan hämtas i batch: {name}"
+    
+    readable = [name for name in names if name not in missing]
+    for name, success, result in file_prefetcher.read_many(product, version, readable):
+        if not success:
+            missing[name] = result
+            continue
+        try:
+            files[name] = str(result[0], 'utf-8')
+        except UnicodeDecodeError:
+            missing[name] = f"Filen är inte UTF-8-text: {name}"
+    
+    return jsonify({
+        "product": product,
+        "version": version,
+        "files": files,
+        "missing": missing
+    })
+
+
 @app.route('/api/scan')
 def rescan():
-    """Tvingar ny skanning"""
-    products = scanner.scan_products()
+    """Tvingar ny skanning (inkrementell, ?full=1 för fullständig)"""
+    full = request.args.get('full', '').lower() in ('1', 'true', 'yes')
+    products = scanner.scan_products(full=full)
+    
+    if "error" in products:
+        return jsonify(products), 500
+    
     return jsonify({
         "message": "Skanning klar",
         "products_found": len(products)
     })
 
 
+@app.route('/api/search')
+def search():
+    """Söker element (name, label, fullname, sid) i alla produkter och versioner"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Parametern q saknas"}), 400
+    
+    try:
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({"error": "Ogiltigt limit-värde"}), 400
+    
+    scanner.ensure_scanned()
+    start = time.perf_counter()
+    hits = search_index.search(query, product=request.args.get('product'),
+                               version=request.args.get('version'), limit=limit)
+    took_ms = (time.perf_counter() - start) * 1000
+    
+    return jsonify({
+        "query": query,
+        "count": len(hits),
+        "took_ms": round(took_ms, 3),
+        "indexing_pending": search_indexer.pending(),
+        "index": search_index.stats(),
+        "hits": hits
+    })
+
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Returnerar latenshistogram per route, trädbyggtider, probe-räknare, skickade bytes och cacheträffar"""
+    snapshot = metrics.snapshot()
+    histograms = snapshot['histograms']
+    return jsonify({
+        "routes": {name[len('route '):]: h for name, h in histograms.items() if name.startswith('route ')},
+        "tree_build_ms": histograms.get('tree_build_ms'),
+        "counters": dict(snapshot['counters'], directory_listings=scanner.manifests.listings,
+                         file_stats=scanner.manifests.file_stats),
+        "cache_hit_ratio": {
+            "tree_cache": scanner.tree_cache.stats()['hit_ratio'],
+            "artifact_cache": scanner.artifact_cache.stats()['hit_ratio'],
+            "hierarchy_cache": scanner.hierarchy_cache.stats()['hit_ratio'],
+            "mirror": _hit_ratio(scanner.mirror.stats()) if scanner.mirror is not None else None,
+            "files": file_prefetcher.stats()['hit_ratio']
+        }
+    })
+
+
+def _hit_ratio(stats: Dict):
+    lookups = stats['hits'] + stats['misses']
+    return round(stats['hits'] / lookups, 4) if lookups else None
+
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Returnerar storlek och träff-/miss-/vräkningsräknare för cacharna"""
+    return jsonify({
+        "tree_cache": scanner.tree_cache.stats(),
+        "artifact_cache": scanner.artifact_cache.stats(),
+        "hierarchy_cache": scanner.hierarchy_cache.stats(),
+        "mirror": scanner.mirror.stats() if scanner.mirror is not None else None,
+        "content_hashes": scanner.content_hasher.stats(),
+        "files": file_prefetcher.stats(),
+        "svg_optimizer": svg_optimizer.stats() if svg_optimizer is not None else None,
+        "snapshots": snapshot_store.stats() if snapshot_store is not None else None,
+        "shared": shared_cache.stats() if shared_cache is not None else None
+    })
+
+
+@app.route('/api/prewarm')
+def prewarm_status():
+    """Returnerar framsteg för förvärmning av träd"""
+    return jsonify(prewarmer.status())
+
+
 @app.route('/')
 def index():
     """Root endpoint med API-information"""
@@ -563,15 +1945,24 @@ def index():
             "/api/products": "Lista alla produkter",
             "/api/product/<product>/versions": "Lista versioner",
             "/api/product/<product>/version/<version>/tree": "Bygg träd",
-            "/api/product/<product>/version/<version>/file/<filepath>": "Hämta fil"
+            "/api/product/<product>/version/<version>/node/<hid>?depth=N": "Hämta nod med begränsat djup",
+            "/api/product/<product>/version/<version>/file/<filepath>": "Hämta fil",
+            "/api/product/<product>/version/<version>/files?names=a.svg,b.svg": "Hämta flera filer i ett svar",
+            "/api/prewarm": "Status för förvärmning av träd",
+            "/api/cache/stats": "Cachestatistik",
+            "/api/metrics": "Latens, trädbyggtider, probe-räknare och cacheträffar",
+            "/api/search?q=...": "Sök element i alla produkter och versioner",
+            "/api/product/<product>/diff?from=<version>&to=<version>": "Jämför två versioner",
+            "/api/product/<product>/version/<version>/thumbnails[/<hid>]": "Alla thumbnails i en bunt med offsetindex"
         }
     })
 
 
 if __name__ == '__main__':
-    print(f"🚀 Skannar: {NETWORK_PATH}")
-    print("📂 Steg 1: [Produkt]_diagrams_1.json → children array")
-    print("📂 Steg 2: *_d.json → inspector.values → .slx filer")
-    print("📂 Steg 3: Rekursivt genom alla .slx filer")
-    print("⚡ Startar Flask-server...")
+    logger.info("🚀 Skannar: %s", ', '.join(str(root) for root in RELEASE_ROOTS))
+    logger.info("📂 Steg 1: [Produkt]_diagrams_1.json → children array")
+    logger.info("📂 Steg 2: *_d.json → inspector.values → .slx filer")
+    logger.info("📂 Steg 3: Rekursivt genom alla .slx filer")
+    logger.info("⚡ Startar Flask-server...")
+    scanner.start_background_scan(SCAN_INTERVAL)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
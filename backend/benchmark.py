@@ -0,0 +1,510 @@
+"""
+Prestandamätning för Simulink WebView Navigation System
+Genererar en syntetisk System_Releases-struktur, kan lägga på latens per filsystemsanrop
+(för att efterlikna SMB) och mäter tid och minne för skanning, trädbygge, filservering
+och alla endpoints.
+
+Exempel:
+    python benchmark.py --products 3 --versions 4 --depth 3 --fanout 4 --latency-ms 5
+    python benchmark.py --root C:\\TestData\\Bench --reuse --output resultat.json
+"""
+
+import argparse
+import builtins
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List
+
+BLOCK_ICONS = ['BlockIcon_icon', 'InportIcon_icon', 'OutportIcon_icon', 'ConstantIcon_icon', 'GainIcon_icon']
+CLASS_NAMES = {'SubSystemIcon_icon': 'Simulink.SubSystem', 'MdlRefBlockIcon_icon': 'Simulink.ModelReference'}
+PARAMS_FILE = '.benchmark.json'
+
+
+# ---------------------------------------------------------------------------
+# Syntetisk releasestruktur
+# ---------------------------------------------------------------------------
+
+def _svg(sid_elements: List[str], title: str, padding: int) -> str:
+    """SVG med en <g> per element (som WebView-exporten) och valfri utfyllnad"""
+    groups = "\n".join(
+        f'  <g id="{sid}" class="block"><rect x="{i * 30}" y="20" width="24" height="16"/></g>'
+        for i, sid in enumerate(sid_elements)
+    )
+    filler = f"\n  <!-- {'x' * padding} -->" if padding else ""
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 800 600">\n'
+            f'  <title>{title}</title>\n{groups}{filler}\n</svg>\n')
+
+
+def _element_json(elements: List[Dict]) -> str:
+    """*_d.json med inspector.values per element (samma form som WebView-exporten)"""
+    return json.dumps([
+        {
+            "sid": element['sid'],
+            "name": element['name'],
+            "icon": element['icon'],
+            "inspector": {"values": [element['name'], element['className'], "on", "off"]}
+        }
+        for element in elements
+    ])
+
+
+def generate_hierarchy(product: str, depth: int, fanout: int, elements: int, leaves: int,
+                       external_models: List[str], rng: random.Random) -> List[Dict]:
+    """Bygger en diagrams_1.json-lista med samma fält som PS200_diagrams_1.json
+
+    Varje subsystem har `fanout` barn ned till `depth` nivåer. Varje nod får
+    `elements` element: barnens SubSystem-block, `leaves` SubSystem utan egen
+    hierarki, ModelRef-block mot de externa modellerna och vanliga block.
+    """
+    hierarchy = []
+    next_sid = [1000]
+
+    def new_sid() -> str:
+        next_sid[0] += rng.randint(1, 7)
+        return f"{product}:{next_sid[0]}"
+
+    def make_node(hid: int, sid: str, parent: int, name: str, fullname: str, class_name: str, icon: str) -> Dict:
+        filename = f"{product}_d" if parent == 0 else f"{sid.replace(':', '_')}_d"
+        return {
+            "hid": hid, "sid": sid, "esid": "", "parent": parent, "children": [],
+            "name": name, "fullname": fullname, "label": name,
+            "className": class_name, "icon": icon,
+            "svg": f"support/slwebview_files/{filename}.svg",
+            "thumbnail": f"support/slwebview_files/{filename}.png",
+            "elements": [],
+            "sysViewURL": f"support/slwebview_files/{filename}.json",
+            "sameAsElement": False
+        }
+
+    root = make_node(1, product, 0, product, product, "Simulink.BlockDiagram", "SimulinkModelIcon_icon")
+    hierarchy.append(root)
+    queue = [(root, 0)]
+    while queue:
+        node, level = queue.pop(0)
+        node_elements = []
+
+        if level < depth:
+            for i in range(fanout):
+                sid = new_sid()
+                name = f"Subsystem_{level + 1}_{i}"
+                child = make_node(len(hierarchy) + 1, sid, node['hid'], name, f"{node['fullname']}/{name}",
+                                  "Simulink.SubSystem", "SubSystemIcon_icon")
+                hierarchy.append(child)
+                node['children'].append(child['hid'])
+                node_elements.append({"sid": sid, "name": name, "icon": "SubSystemIcon_icon"})
+                queue.append((child, level + 1))
+
+        for i in range(leaves):
+            node_elements.append({"sid": new_sid(), "name": f"Leaf_{i}", "icon": "SubSystemIcon_icon"})
+
+        if level == 1:
+            for model in external_models:
+                node_elements.append({"sid": new_sid(), "name": model, "icon": "MdlRefBlockIcon_icon"})
+
+        while len(node_elements) < elements:
+            icon = rng.choice(BLOCK_ICONS)
+            node_elements.append({"sid": new_sid(), "name": f"{icon.split('Icon')[0]}_{len(node_elements)}", "icon": icon})
+
+        for element in node_elements:
+            element.update({
+                "label": element['name'],
+                "className": CLASS_NAMES.get(element['icon'], "Simulink.Block"),
+                "rsid": element['sid']
+            })
+        node['elements'] = node_elements
+
+    return hierarchy
+
+
+def write_release(webview_path: Path, product: str, hierarchy: List[Dict], version_index: int,
+                  changed_ratio: float, svg_padding: int, rng: random.Random) -> int:
+    """Skriver diagrams_1.json plus _d.svg/_d.json för alla klickbara diagram, returnerar antal filer"""
+    webview_path.mkdir(parents=True, exist_ok=True)
+    (webview_path / f"{product}_diagrams_1.json").write_text(json.dumps(hierarchy), encoding='utf-8')
+    written = 1
+
+    def write_diagram(base: str, title: str, elements: List[Dict]) -> None:
+        nonlocal written
+        # En andel diagram ändras mellan versioner så att versionsjämförelsen har något att hitta
+        revision = version_index if rng.random() < changed_ratio else 0
+        (webview_path / f"{base}.svg").write_text(
+            _svg([e['sid'] for e in elements], f"{title} r{revision}", svg_padding), encoding='utf-8')
+        (webview_path / f"{base}.json").write_text(_element_json(elements), encoding='utf-8')
+        written += 2
+
+    # Subsystem med egen nod skrivs via noden, övriga klickbara block (leaf/ModelRef) får egna filer här
+    node_sids = {node['sid'] for node in hierarchy}
+    for node in hierarchy:
+        base = node['svg'].split('/')[-1][:-len('.svg')]
+        write_diagram(base, node['fullname'], node['elements'])
+        for element in node['elements']:
+            if element['icon'] in CLASS_NAMES and element['sid'] not in node_sids:
+                write_diagram(element['sid'].replace(':', '_') + '_d', element['name'], [])
+    return written
+
+
+def generate_share(root: Path, products: int, versions: int, depth: int, fanout: int, elements: int,
+                   leaves: int, externals: int, changed_ratio: float, svg_padding: int, seed: int) -> Dict:
+    """Genererar en syntetisk System_Releases-katalog och returnerar en sammanfattning"""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    summary = {"products": {}, "files": 0, "nodes": 0}
+
+    for p in range(products):
+        product = f"BP{100 + p}"
+        external_models = [f"{product}Lib{k}" for k in range(externals)]
+        hierarchy = generate_hierarchy(product, depth, fanout, elements, leaves, external_models, rng)
+        version_names = [f"1.0.{v // 10}.{v % 10}" for v in range(versions)]
+
+        for v, version in enumerate(version_names):
+            webview_path = root / f"{product}_{version}" / f"WebView_{product}" / "support" / "slwebview_files"
+            summary['files'] += write_release(webview_path, product, hierarchy, v, changed_ratio, svg_padding, rng)
+            for model in external_models:
+                model_hierarchy = generate_hierarchy(model, 1, max(1, fanout // 2), max(4, elements // 4), 0, [], rng)
+                summary['files'] += write_release(webview_path, model, model_hierarchy, v, changed_ratio,
+                                                  svg_padding, rng)
+
+        summary['products'][product] = version_names
+        summary['nodes'] += len(hierarchy) * versions
+
+    # Mappar som skanningen ska hoppa över
+    (root / "junkfolder").mkdir(exist_ok=True)
+    (root / f"NOWEB{products}_1.0.0.0").mkdir(exist_ok=True)
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Latensinjektion
+# ---------------------------------------------------------------------------
+
+class LatencyInjector:
+    """Lägger på fördröjning per filsystemsanrop under en rotkatalog (efterliknar SMB)
+
+    Patchar os.stat/lstat/listdir/scandir och open; räknar anropen per typ.
+    DirEntry.stat() från scandir kan inte patchas och räknas därför inte.
+    """
+
+    def __init__(self, root: Path, latency_ms: float):
+        self.root = str(Path(root).resolve())
+        self.latency = latency_ms / 1000
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def _hit(self, kind: str, path) -> None:
+        try:
+            path = os.fspath(path)
+        except TypeError:
+            return
+        if isinstance(path, bytes):
+            path = path.decode(errors='replace')
+        if not isinstance(path, str) or not os.path.abspath(path).startswith(self.root):
+            return
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _wrap(self, kind: str, original: Callable) -> Callable:
+        def wrapper(path='.', *args, **kwargs):
+            self._hit(kind, path)
+            return original(path, *args, **kwargs)
+        return wrapper
+
+    def reset_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts, self.calls = self.calls, {}
+        return counts
+
+    def __enter__(self):
+        targets = [(os, 'stat'), (os, 'lstat'), (os, 'listdir'), (os, 'scandir'), (builtins, 'open'), (io, 'open')]
+        for module, name in targets:
+            original = getattr(module, name)
+            self._originals[(module, name)] = original
+            setattr(module, name, self._wrap(name, original))
+        return self
+
+    def __exit__(self, *exc):
+        for (module, name), original in self._originals.items():
+            setattr(module, name, original)
+        self._originals = {}
+
+
+# ---------------------------------------------------------------------------
+# Mätning
+# ---------------------------------------------------------------------------
+
+class Benchmark:
+    """Kör mätfall och samlar tider, minnestoppar och antal filsystemsanrop"""
+
+    def __init__(self, repeat: int, injector: LatencyInjector = None, trace_memory: bool = True):
+        self.repeat = repeat
+        self.injector = injector
+        self.trace_memory = trace_memory
+        self.results: List[Dict] = []
+
+    def measure(self, name: str, action: Callable, setup: Callable = None, repeat: int = None) -> Dict:
+        """Kör `action` `repeat` gånger (med `setup` före varje körning) och registrerar resultatet"""
+        timings = []
+        calls = {}
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            if self.injector is not None:
+                self.injector.reset_counts()
+            start = time.perf_counter()
+            action()
+            timings.append((time.perf_counter() - start) * 1000)
+            if self.injector is not None:
+                calls = self.injector.reset_counts()
+
+        # Minnestoppen mäts i en separat körning eftersom tracemalloc gör allt långsammare
+        peak_kb = None
+        if self.trace_memory:
+            if setup is not None:
+                setup()
+            tracemalloc.start()
+            try:
+                action()
+                peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+            finally:
+                tracemalloc.stop()
+
+        result = {
+            "name": name,
+            "runs": len(timings),
+            "min_ms": round(min(timings), 3),
+            "median_ms": round(statistics.median(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "peak_kb": peak_kb,
+            "fs_calls": sum(calls.values()) if self.injector is not None else None
+        }
+        self.results.append(result)
+        print(f"  {name:<58} {result['median_ms']:>10.2f} ms  {peak_kb if peak_kb is not None else '-':>8} KB"
+              f"  {result['fs_calls'] if result['fs_calls'] is not None else '-':>6} anrop", flush=True)
+        return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_benchmarks(share: Path, summary: Dict, args) -> Dict:
+    """Importerar appen mot den genererade strukturen och mäter alla steg"""
+    os.environ['RELEASES_DIR'] = str(share)
+    os.environ.pop('RELEASE_ROOTS', None)
+    os.environ.setdefault('SCAN_INTERVAL', '0')
+    os.environ.setdefault('PREWARM_LATEST', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('MIRROR_DIR', '')
+    os.environ.setdefault('SHARED_CACHE_PATH', '')
+    # Optimerade SVG:er och snapshots från en tidigare körning skulle annars serveras i stället för källfilerna
+    os.environ.setdefault('SVG_OPTIMIZE_DIR', '')
+    os.environ.setdefault('SNAPSHOT_DIR', '')
+    os.environ.setdefault('TREE_INDEX_PATH', str(Path(tempfile.mkdtemp(prefix='lia-bench-index-')) / 'tree_index.sqlite')
+                          if args.tree_index else '')
+    sys.path.insert(0, str(Path(__file__).parent))
+    import app as lia
+
+    scanner = lia.scanner
+    client = lia.app.test_client()
+    products = summary['products']
+    product = sorted(products)[0]
+    versions = sorted(products[product], reverse=True)
+    version = versions[0]
+
+    def reset_caches():
+        scanner.tree_cache.invalidate()
+        scanner.artifact_cache.invalidate()
+        scanner.hierarchy_cache.invalidate()
+        scanner.manifests.invalidate()
+        scanner.content_hasher.invalidate()
+
+    def get(url: str, expect: int = 200, **kwargs):
+        response = client.get(url, **kwargs)
+        if response.status_code != expect:
+            raise RuntimeError(f"{url} gav {response.status_code}: {response.data[:200]!r}")
+        return response
+
+    injector = LatencyInjector(share, args.latency_ms) if args.latency_ms or args.count_calls else None
+    bench = Benchmark(args.repeat, injector, trace_memory=not args.no_memory)
+    started = time.time()
+
+    with (injector if injector is not None else _nullcontext()):
+        print("\n📁 Skanning")
+        bench.measure("scan_products (kall)", lambda: scanner.scan_products(full=True))
+        bench.measure("scan_products (inkrementell)", scanner.scan_products)
+        
+        # Vänta in sökindexeringen som skanningarna startade så att den inte stör mätningarna
+        deadline = time.time() + 120
+        while lia.search_indexer.pending() and time.time() < deadline:
+            time.sleep(0.05)
+
+        print("\n🌳 Trädbygge")
+        bench.measure(f"build_tree_from_root kall ({product} v{version})",
+                      lambda: scanner.build_tree_from_root(product, version, use_cache=False), setup=reset_caches)
+        bench.measure("build_tree_from_root varmt manifest",
+                      lambda: scanner.build_tree_from_root(product, version, use_cache=False))
+        bench.measure("build_tree_from_root cachat", lambda: scanner.build_tree_from_root(product, version))
+        tree = scanner.build_tree_from_root(product, version)
+        bench.measure("compact_tree", lambda: lia.compact_tree(tree))
+        bench.measure("alla produkter och versioner, kallt", lambda: [
+            scanner.build_tree_from_root(p, v, use_cache=False) for p, vs in products.items() for v in vs
+        ], setup=reset_caches, repeat=1)
+        bench.measure(f"diff_versions kall (v{versions[-1]} → v{version})",
+                      lambda: scanner.diff_versions(product, versions[-1], version), setup=reset_caches)
+
+        print("\n📄 Filservering")
+        svg_names = [e['svg'] for e in tree.get('clickable_elements', [])][:20] or [tree['svg']]
+        file_base = f"/api/product/{product}/version/{version}/file"
+        bench.measure(f"{len(svg_names)} SVG (kallt manifest)",
+                      lambda: [get(f"{file_base}/{name}") for name in svg_names], setup=scanner.manifests.invalidate)
+        bench.measure(f"{len(svg_names)} SVG (varmt)", lambda: [get(f"{file_base}/{name}") for name in svg_names])
+        etag = get(f"{file_base}/{svg_names[0]}").headers.get('ETag')
+        bench.measure("SVG If-None-Match → 304",
+                      lambda: get(f"{file_base}/{svg_names[0]}", expect=304, headers={'If-None-Match': etag}))
+        json_name = tree['json']
+        bench.measure("JSON ?fields=sid,name", lambda: get(f"{file_base}/{json_name}?fields=sid,name"))
+
+        print("\n🌐 Endpoints")
+        other_version = versions[-1]
+        endpoint_urls = {
+            '/': '/',
+            '/api/products': '/api/products',
+            '/api/product/<product>/versions': f'/api/product/{product}/versions',
+            '/api/product/<product>/version/<version>/tree': f'/api/product/{product}/version/{version}/tree',
+            '/api/product/<product>/version/<version>/node': f'/api/product/{product}/version/{version}/node?depth=1',
+            '/api/product/<product>/version/<version>/node/<int:hid>':
+                f'/api/product/{product}/version/{version}/node/{tree["hid"]}?depth=2',
+            '/api/product/<product>/version/<version>/file/<path:filepath>': f'{file_base}/{tree["svg"]}',
+            '/api/product/<product>/version/<version>/files':
+                f'/api/product/{product}/version/{version}/files?names='
+                + ','.join(name.split('/')[-1] for name in svg_names),
+            '/api/product/<product>/version/<version>/thumbnails':
+                f'/api/product/{product}/version/{version}/thumbnails',
+            '/api/product/<product>/version/<version>/thumbnails/<int:hid>':
+                f'/api/product/{product}/version/{version}/thumbnails/{tree["hid"]}',
+            '/api/product/<product>/diff': f'/api/product/{product}/diff?from={other_version}&to={version}',
+            '/api/search': '/api/search?q=subsystem',
+            '/api/scan': '/api/scan',
+            '/api/metrics': '/api/metrics',
+            '/api/cache/stats': '/api/cache/stats',
+            '/api/prewarm': '/api/prewarm',
+        }
+        extra_urls = [f'/api/product/{product}/version/{version}/tree?format=compact']
+
+        missing = []
+        for rule in sorted(lia.app.url_map.iter_rules(), key=lambda r: r.rule):
+            if rule.endpoint == 'static' or 'GET' not in rule.methods:
+                continue
+            url = endpoint_urls.get(rule.rule)
+            if url is None:
+                missing.append(rule.rule)
+                continue
+            bench.measure(f"GET {url}", lambda url=url: get(url))
+        for url in extra_urls:
+            bench.measure(f"GET {url}", lambda url=url: get(url))
+        if missing:
+            print(f"  ⚠️  Ingen mätning för: {', '.join(missing)}")
+
+    return {
+        "commit": _git_commit(),
+        "started_at": started,
+        "python": sys.version.split()[0],
+        "parameters": {key: value for key, value in vars(args).items() if key not in ('output',)},
+        "share": {"root": str(share), "files": summary['files'], "nodes": summary['nodes'],
+                  "products": len(products), "versions": sum(len(v) for v in products.values())},
+        "results": bench.results
+    }
+
+
+@contextmanager
+def _nullcontext():
+    yield
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prestandamätning mot en syntetisk System_Releases-struktur")
+    parser.add_argument('--root', help="Katalog för den syntetiska strukturen (standard: temporär katalog)")
+    parser.add_argument('--reuse', action='store_true', help="Återanvänd --root om den genererats med samma parametrar")
+    parser.add_argument('--keep', action='store_true', help="Behåll en temporär struktur efter körningen")
+    parser.add_argument('--generate-only', action='store_true', help="Generera strukturen och avsluta")
+    parser.add_argument('--products', type=int, default=3)
+    parser.add_argument('--versions', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=3, help="Hierarkidjup under root")
+    parser.add_argument('--fanout', type=int, default=4, help="Barn-subsystem per nod")
+    parser.add_argument('--elements', type=int, default=24, help="Element per nod")
+    parser.add_argument('--leaves', type=int, default=2, help="SubSystem utan egen hierarki per nod")
+    parser.add_argument('--externals', type=int, default=2, help="ModelRef-modeller med egen diagrams_1.json")
+    parser.add_argument('--changed', type=float, default=0.05, help="Andel diagram som ändras mellan versioner")
+    parser.add_argument('--svg-padding', type=int, default=2048, help="Extra bytes per SVG")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Fördröjning per filsystemsanrop")
+    parser.add_argument('--count-calls', action='store_true', help="Räkna filsystemsanrop även utan latens")
+    parser.add_argument('--tree-index', action='store_true', help="Använd ett (temporärt) SQLite-trädindex")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="Hoppa över minnesmätning med tracemalloc")
+    parser.add_argument('--output', help="Skriv resultatet som JSON hit")
+    args = parser.parse_args(argv)
+
+    temporary = args.root is None
+    share = Path(args.root or tempfile.mkdtemp(prefix='lia-bench-')).resolve()
+    shape = {key: getattr(args, key) for key in
+             ('products', 'versions', 'depth', 'fanout', 'elements', 'leaves', 'externals', 'changed',
+              'svg_padding', 'seed')}
+
+    params_file = share / PARAMS_FILE
+    summary = None
+    if args.reuse and params_file.exists():
+        saved = json.loads(params_file.read_text(encoding='utf-8'))
+        if saved.get('shape') == shape:
+            summary = saved['summary']
+            print(f"♻️  Återanvänder {share}")
+
+    if summary is None:
+        if share.exists() and any(share.iterdir()) and not temporary:
+            if not params_file.exists():
+                print(f"❌ {share} är inte tom och skapades inte av benchmark.py")
+                return 1
+            shutil.rmtree(share)
+        print(f"🏗️  Genererar syntetisk struktur i {share}")
+        start = time.perf_counter()
+        summary = generate_share(share, args.products, args.versions, args.depth, args.fanout, args.elements,
+                                 args.leaves, args.externals, args.changed, args.svg_padding, args.seed)
+        params_file.write_text(json.dumps({"shape": shape, "summary": summary}), encoding='utf-8')
+        print(f"   {summary['files']} filer, {summary['nodes']} noder ({time.perf_counter() - start:.1f} s)")
+
+    if args.generate_only:
+        return 0
+
+    try:
+        report = run_benchmarks(share, summary, args)
+    finally:
+        if temporary and not args.keep:
+            shutil.rmtree(share, ignore_errors=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n💾 Resultat sparat i {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
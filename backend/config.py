@@ -18,6 +18,12 @@ class Config:
     USE_NETWORK = os.environ.get('USE_NETWORK', 'True').lower() == 'true'
     BASE_PATH = NETWORK_PATH if USE_NETWORK else LOCAL_TEST_PATH
     
+    # Flera releaserötter i prioritetsordning, separerade med os.pathsep (; på Windows)
+    RELEASE_ROOTS = [Path(p).resolve() for p in os.getenv('RELEASE_ROOTS', '').split(os.pathsep) if p] or [BASE_PATH]
+    
+    # Sekunder att vänta på en rot vid skanning innan den räknas som otillgänglig
+    ROOT_SCAN_TIMEOUT = 10
+    
     # Cache-inställningar
     CACHE_ENABLED = True
     CACHE_TIMEOUT = 300  # 5 minuter
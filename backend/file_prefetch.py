@@ -0,0 +1,126 @@
+"""
+Filcache i minnet för Simulink WebView Navigation System
+Håller nyligen lästa releasefiler som bytes och förhämtar SVG:er för en nods klickbara barn
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import metrics
+from process_local import ProcessLocalExecutor
+from single_flight import SingleFlight
+from tree_cache import TreeCache
+
+logger = logging.getLogger('lia.prefetch')
+
+
+class FilePrefetcher:
+    """LRU-cache av filinnehåll nycklad på (produkt, version, filnamn)
+
+    Releasefiler ändras aldrig efter publicering, så en läst fil kan
+    serveras ur minnet tills versionen försvinner vid en skanning. Läsningar
+    av samma fil (t.ex. en förhämtning och användarens klick) delas.
+    """
+
+    def __init__(self, scanner, max_bytes: int, max_file_bytes: int = 8 * 1024 * 1024, workers: int = 4):
+        self.scanner = scanner
+        self.max_file_bytes = max_file_bytes
+        self.enabled = max_bytes > 0
+        self._blobs = TreeCache(max_entries=100000, max_bytes=max_bytes)
+        self._flight = SingleFlight('file')
+        self._executor = ProcessLocalExecutor(max_workers=max(1, workers), thread_name_prefix='file-prefetch')
+        self._lock = threading.Lock()
+        self._queued = set()
+        self.prefetched = 0
+
+    def get(self, product: str, version: str, name: str) -> Optional[Tuple[bytes, int]]:
+        """Returnerar (innehåll, mtime_ns) vid träff, annars None"""
+        if not self.enabled:
+            return None
+        return self._blobs.get((product, version, name))
+
+    def read(self, product: str, version: str, name: str) -> Tuple[bool, object]:
+        """Läser en fil via cachen: (True, (innehåll, mtime_ns)) eller (False, felmeddelande)
+
+        Innehållet är bytes, eller en memoryview när filen kommer ur en snapshot.
+        """
+        key = (product, version, name)
+        cached = self.get(*key)
+        if cached is not None:
+            return True, cached
+        return self._flight.do(key, lambda: self._load(key))
+
+    def read_many(self, product: str, version: str, names: Iterable[str]) -> List[Tuple[str, bool, object]]:
+        """Läser flera filer samtidigt och returnerar [(filnamn, lyckades, resultat)] i samma ordning"""
+        names = list(names)
+        results = self._executor.map(lambda name: self.read(product, version, name), names)
+        return [(name, success, result) for name, (success, result) in zip(names, results)]
+
+    def _load(self, key: Tuple[str, str, str]) -> Tuple[bool, object]:
+        # Kompilerade versioner ligger redan i minnet via snapshotens mmap
+        snapshot = self.scanner.snapshot_for(key[0], key[1])
+        found = snapshot.file(key[2]) if snapshot is not None else None
+        if found is not None:
+            return True, found
+
+        success, file_path = self.scanner.resolve_file(*key)
+        if not success:
+            return False, file_path
+
+        try:
+            with open(file_path, 'rb') as f:
+                mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                data = f.read()
+        except OSError as e:
+            return False, str(e)
+
+        if self.enabled and len(data) <= self.max_file_bytes:
+            self._blobs.put(key, (data, mtime_ns), size=len(data))
+        return True, (data, mtime_ns)
+
+    def prefetch(self, product: str, version: str, names: Iterable[str]) -> int:
+        """Köar läsning av filer som inte redan finns i minnet, returnerar antal köade"""
+        if not self.enabled:
+            return 0
+
+        queued = 0
+        with self._lock:
+            for name in names:
+                key = (product, version, name)
+                if key in self._queued or key in self._blobs:
+                    continue
+                self._queued.add(key)
+                self._executor.submit(self._prefetch, key)
+                queued += 1
+        return queued
+
+    def _prefetch(self, key: Tuple[str, str, str]) -> None:
+        try:
+            success, _ = self.read(*key)
+            if success:
+                metrics.inc('file_prefetches')
+                with self._lock:
+                    self.prefetched += 1
+        except Exception as e:
+            logger.warning("⚠️  Kunde inte förhämta %s: %s", key[2], e)
+        finally:
+            with self._lock:
+                self._queued.discard(key)
+
+    def on_scan(self, products: Dict) -> None:
+        """Skanningslyssnare: glömmer filer för versioner som inte längre finns"""
+        if not isinstance(products, dict) or "error" in products:
+            return
+
+        current = {(product, v['version']) for product, versions in products.items() for v in versions}
+        for key in self._blobs.keys():
+            if key[:2] not in current:
+                self._blobs.invalidate(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            queued = len(self._queued)
+            prefetched = self.prefetched
+        return dict(self._blobs.stats(), queued=queued, prefetched=prefetched)
@@ -0,0 +1,127 @@
+"""
+Strömmande läsning av diagrams_1.json för Simulink WebView Navigation System
+Parsar hierarkin nod för nod och behåller bara de fält som trädbygget använder
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, TextIO
+
+# Fält som trädbygget, sökindexet, versionsjämförelsen och miniatyrbuntarna läser
+NODE_FIELDS = ('hid', 'sid', 'parent', 'children', 'name', 'label', 'fullname', 'className', 'icon', 'svg',
+               'sysViewURL', 'thumbnail')
+ELEMENT_FIELDS = ('sid', 'name', 'label', 'icon')
+
+# Värden som upprepas i varje nod och delas via sys.intern
+INTERNED_FIELDS = ('className', 'icon')
+
+READ_CHUNK = 1024 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def slim_node(node: Dict) -> Dict:
+    """Kopierar en nod med bara de använda fälten (och elementens sid/name/label/icon)"""
+    slim = {key: node[key] for key in NODE_FIELDS if key in node}
+    for key in INTERNED_FIELDS:
+        value = slim.get(key)
+        if isinstance(value, str):
+            slim[key] = sys.intern(value)
+
+    elements = node.get('elements')
+    if elements is not None:
+        intern = sys.intern
+        slim_elements = []
+        for element in elements:
+            try:
+                # Snabbväg: element i WebView-exporter har alltid alla fyra fälten
+                slim_element = {'sid': element['sid'], 'name': element['name'], 'label': element['label'],
+                                'icon': intern(element['icon'])}
+            except (KeyError, TypeError):
+                slim_element = {key: element[key] for key in ELEMENT_FIELDS if key in element}
+                if isinstance(slim_element.get('icon'), str):
+                    slim_element['icon'] = intern(slim_element['icon'])
+            slim_elements.append(slim_element)
+        slim['elements'] = slim_elements
+    return slim
+
+
+def iter_hierarchy(f: TextIO, chunk_size: int = READ_CHUNK) -> Iterator[Dict]:
+    """Strömmar noderna i en diagrams_1.json-array utan att läsa in hela filen
+
+    Bufferten innehåller bara det som ännu inte avkodats. Om en nod inte
+    ryms i bufferten läses mer in (med dubblerad blockstorlek) och
+    avkodningen görs om från nodens början.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = 0
+    eof = not buffer
+    read_size = chunk_size
+
+    def skip_whitespace():
+        nonlocal buffer, pos, eof
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or eof:
+                return
+            data = f.read(chunk_size)
+            eof = not data
+            buffer, pos = data, 0
+
+    skip_whitespace()
+    if buffer.startswith('\ufeff', pos):
+        pos += 1
+        skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("diagrams_1.json är inte en JSON-array")
+    pos += 1
+
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Oväntat filslut i diagrams_1.json")
+
+        char = buffer[pos]
+        if char == ']':
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"Ogiltig JSON i diagrams_1.json vid tecken {char!r}")
+            pos += 1
+            expect_value = True
+            continue
+
+        try:
+            node, end = decoder.raw_decode(buffer, pos)
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+
+        if not complete:
+            # Noden (eller ett avslutande tal) är avklippt - läs mer och försök igen
+            data = f.read(read_size)
+            eof = not data
+            buffer, pos = buffer[pos:] + data, 0
+            read_size *= 2
+            continue
+
+        read_size = chunk_size
+        pos = end
+        expect_value = False
+        yield node
+
+        # Släpp det redan avkodade så att bufferten inte växer med filen
+        if pos > chunk_size:
+            buffer, pos = buffer[pos:], 0
+
+
+def load_hierarchy(path: Path) -> List[Dict]:
+    """Läser diagrams_1.json strömmande och returnerar bantade noder"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [slim_node(node) for node in iter_hierarchy(f)]
@@ -0,0 +1,132 @@
+"""
+Katalogmanifest för Simulink WebView Navigation System
+Håller en listning per slwebview_files-katalog som en mängd, så att
+existenskontroller blir uppslag i minnet istället för nätverksanrop
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class Manifest(frozenset):
+    """Mängd av filnamn i en katalog, jämförs skiftlägesokänsligt där OS:et gör det"""
+
+    def __contains__(self, name) -> bool:
+        return frozenset.__contains__(self, os.path.normcase(name))
+
+
+EMPTY_MANIFEST = Manifest()
+
+
+def safe_relative_name(name: str) -> bool:
+    """Sant om filnamnet är en relativ sökväg som stannar i sin katalog (inga '..', ingen rot eller enhet)"""
+    path = Path(name)
+    return bool(name) and not path.anchor and '..' not in path.parts and '..' not in name.split('\\')
+
+
+class ManifestCache:
+    """Cache av katalogmanifest, invaliderat via katalogens mtime
+
+    Katalogens mtime kontrolleras högst en gång per `revalidate_after` sekunder,
+    däremellan besvaras alla uppslag direkt från minnet. Detsamma gäller
+    filsignaturer (storlek, mtime_ns) från `signature`, som fångar filer som
+    skrivits om på plats utan att katalogens mtime ändrats.
+    """
+
+    def __init__(self, revalidate_after: float = 2.0, max_signatures: int = 65536):
+        self.revalidate_after = revalidate_after
+        self.max_signatures = max_signatures
+        self._entries: Dict[str, list] = {}
+        self._signatures: "OrderedDict[str, Tuple[Optional[Tuple[int, int]], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.listings = 0
+        self.file_stats = 0
+
+    def get(self, directory: Path) -> Manifest:
+        """Returnerar manifestet för katalogen"""
+        names = self.listing(directory)
+        return names if names is not None else EMPTY_MANIFEST
+
+    def listing(self, directory: Path) -> Optional[Manifest]:
+        """Returnerar manifestet för katalogen, eller None om den inte kan läsas (t.ex. nätverket är borta)"""
+        key = str(directory)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[2] < self.revalidate_after:
+                return entry[1]
+
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+        if entry is not None and entry[0] == mtime_ns:
+            entry[2] = now
+            return entry[1]
+
+        try:
+            names = Manifest(os.path.normcase(name) for name in os.listdir(directory))
+        except OSError:
+            return None
+
+        with self._lock:
+            self._entries[key] = [mtime_ns, names, now]
+            self.listings += 1
+        return names
+
+    def exists(self, directory: Path, name: str) -> bool:
+        """Kollar om en fil finns i katalogen via manifestet"""
+        return name in self.get(directory)
+
+    def signature(self, path: Path) -> Tuple[int, int]:
+        """Returnerar (storlek, mtime_ns) för en fil - kastar FileNotFoundError om den saknas
+
+        Svaret (även att filen saknas) återanvänds i `revalidate_after` sekunder.
+        Andra OSError (t.ex. nätverket är borta) cachas inte utan kastas vidare.
+        """
+        key = str(path)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._signatures.get(key)
+            if entry is not None and now - entry[1] < self.revalidate_after:
+                self._signatures.move_to_end(key)
+                sig = entry[0]
+                if sig is None:
+                    raise FileNotFoundError(f"Fil inte hittad: {path}")
+                return sig
+
+        try:
+            st = os.stat(path)
+            sig = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            sig = None
+
+        with self._lock:
+            self._signatures[key] = (sig, now)
+            self._signatures.move_to_end(key)
+            self.file_stats += 1
+            while len(self._signatures) > self.max_signatures:
+                self._signatures.popitem(last=False)
+        if sig is None:
+            raise FileNotFoundError(f"Fil inte hittad: {path}")
+        return sig
+
+    def invalidate(self, directory: Optional[Path] = None) -> None:
+        """Glömmer manifestet för en katalog (eller alla)"""
+        with self._lock:
+            if directory is None:
+                self._entries.clear()
+                self._signatures.clear()
+            else:
+                self._entries.pop(str(directory), None)
+                for key in [key for key in self._signatures if Path(key).parent == Path(directory)]:
+                    del self._signatures[key]
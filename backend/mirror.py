@@ -0,0 +1,162 @@
+"""
+Lokal spegel av releasekatalogen för Simulink WebView Navigation System
+Läs-genom-cache av slwebview_files-innehåll med storleksgräns och LRU-vräkning
+"""
+
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from process_local import ProcessLocalExecutor
+
+logger = logging.getLogger('lia.mirror')
+
+
+class ReleaseMirror:
+    """Lokal läs-genom-cache nycklad på releasemapp och filnamn
+
+    Missar fylls i bakgrunden; träffar serveras från lokal disk utan att
+    nätverksresursen behöver vara nåbar.
+    """
+
+    def __init__(self, root: str, max_bytes: int, workers: int = 2):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._in_flight = set()
+        self._executor = ProcessLocalExecutor(max_workers=workers, thread_name_prefix='mirror-fill')
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        """Läser in redan speglade filer, äldst använda först"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith('.part'):
+                    continue
+                path = Path(dirpath) / filename
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                rel = path.relative_to(self.root)
+                if len(rel.parts) < 2:
+                    continue
+                key = (rel.parts[0], '/'.join(rel.parts[1:]))
+                found.append((st.st_atime, key, st.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _local_path(self, folder: str, name: str) -> Path:
+        return self.root / folder / name
+
+    def lookup(self, folder: str, name: str, source_sig: Tuple[int, int] = None) -> Optional[Path]:
+        """Returnerar lokal sökväg vid träff, annars None
+
+        Med `source_sig` (storlek, mtime_ns) kontrolleras även att kopian
+        matchar källfilen.
+        """
+        key = (folder, name)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._local_path(folder, name)
+        if source_sig is not None:
+            try:
+                st = path.stat()
+            except OSError:
+                st = None
+            if st is None or (st.st_size, st.st_mtime_ns) != tuple(source_sig):
+                self._forget(key)
+                with self._lock:
+                    self.misses += 1
+                return None
+
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def schedule_fill(self, folder: str, name: str, source: Path) -> None:
+        """Kopierar en fil till spegeln i bakgrunden (dubbletter ignoreras)"""
+        key = (folder, name)
+        with self._lock:
+            if key in self._entries or key in self._in_flight:
+                return
+            self._in_flight.add(key)
+        self._executor.submit(self._fill, key, source)
+
+    def _fill(self, key: Tuple[str, str], source: Path) -> None:
+        target = self._local_path(*key)
+        tmp = target.with_name(target.name + '.part')
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(source, tmp)
+            os.replace(tmp, target)
+            size = target.stat().st_size
+            with self._lock:
+                previous = self._entries.pop(key, 0)
+                self._entries[key] = size
+                self.total_bytes += size - previous
+            self._evict()
+        except OSError as e:
+            logger.warning("⚠️  Kunde inte spegla %s: %s", source, e)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def _forget(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is None:
+                return
+            self.total_bytes -= size
+        try:
+            self._local_path(*key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """Vräker minst nyligen använda filer tills spegeln ryms i max_bytes"""
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes or not self._entries:
+                    return
+                key, size = self._entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+            try:
+                self._local_path(*key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        """Returnerar storlek och träff-/miss-räknare"""
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,92 @@
+"""
+Förvärmning av navigeringsträd för Simulink WebView Navigation System
+Bygger träd för de senaste versionerna av varje produkt i en trådpool efter skanning
+"""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from process_local import ProcessLocalExecutor
+
+
+class TreePrewarmer:
+    """Bygger träd i förväg så att första användaren slipper vänta på trädbygget"""
+
+    def __init__(self, scanner, latest: int = 2, workers: int = 2):
+        self.scanner = scanner
+        self.latest = latest
+        self._executor = ProcessLocalExecutor(max_workers=max(1, workers), thread_name_prefix='tree-prewarm')
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._done = set()
+        self.total = 0
+        self.completed = 0
+        self.failed: List[Dict] = []
+        self.started_at = None
+        self.finished_at = None
+
+    def targets(self, products: Dict) -> List[Tuple[str, str]]:
+        """Väljer de `latest` senaste versionerna per produkt"""
+        selected = []
+        for product, versions in products.items():
+            for version_data in versions[:self.latest]:
+                selected.append((product, version_data['version']))
+        return selected
+
+    def schedule(self, products: Dict) -> int:
+        """Köar trädbyggen för nya mål, returnerar antal köade"""
+        if self.latest <= 0 or not isinstance(products, dict) or "error" in products:
+            return 0
+
+        with self._lock:
+            # Ett förvärmt träd som vräkts ur trädcachen värms igen vid nästa skanning
+            new = [key for key in self.targets(products) if key not in self._pending
+                   and (key not in self._done or self._evicted(key))]
+            if not new:
+                return 0
+            if not self._pending:
+                self.started_at = time.time()
+                self.finished_at = None
+            for key in new:
+                self._pending.add(key)
+                self.total += 1
+                self._executor.submit(self._warm, key)
+        return len(new)
+
+    def _evicted(self, key: Tuple[str, str]) -> bool:
+        # Snapshottade versioner har trädet i snapshoten och läggs aldrig i trädcachen
+        return f"{key[0]}:{key[1]}" not in self.scanner.tree_cache and self.scanner.snapshot_for(*key) is None
+
+    def _warm(self, key: Tuple[str, str]) -> None:
+        product, version = key
+        error = None
+        try:
+            tree = self.scanner.build_tree_from_root(product, version)
+            if "error" in tree:
+                error = tree["error"]
+        except Exception as e:
+            error = str(e)
+
+        with self._lock:
+            self._pending.discard(key)
+            self._done.add(key)
+            self.completed += 1
+            if error:
+                self.failed.append({"product": product, "version": version, "error": error})
+            if not self._pending:
+                self.finished_at = time.time()
+
+    def status(self) -> Dict:
+        """Returnerar förvärmningens framsteg"""
+        with self._lock:
+            return {
+                "state": "running" if self._pending else ("done" if self.total else "idle"),
+                "latest_per_product": self.latest,
+                "total": self.total,
+                "completed": self.completed,
+                "pending": sorted(f"{p}:{v}" for p, v in self._pending),
+                "failed": list(self.failed),
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
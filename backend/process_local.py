@@ -0,0 +1,45 @@
+"""
+Processlokala trådpooler för Simulink WebView Navigation System
+Trådar överlever inte fork (t.ex. gunicorn --preload), så varje process skapar sin egen pool vid första användningen
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+
+
+class ProcessLocalExecutor:
+    """Trådpool med samma gränssnitt som ThreadPoolExecutor, skapad per process
+
+    En pool som skapats före en fork har inga trådar i barnprocessen och
+    skulle aldrig köra något; här upptäcks bytet av process-id och en ny
+    pool skapas.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ''):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix=self.thread_name_prefix)
+                    self._pid = pid
+        return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self._pool().submit(fn, *args, **kwargs)
+
+    def map(self, fn: Callable, *iterables, timeout: float = None) -> Iterator:
+        return self._pool().map(fn, *iterables, timeout=timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,304 @@
+"""
+Releasesnapshots för Simulink WebView Navigation System
+Kompilerar en versions slwebview_files-katalog till en enda fil med förbyggt träd,
+offsetindex och alla filer, som servern öppnar med mmap och serverar som skivor utan kopiering.
+
+Exempel:
+    python release_snapshot.py PS200 1.0.2.5
+    python release_snapshot.py --all --output D:\\Lia\\snapshots
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('lia.snapshot')
+
+SNAPSHOT_SUFFIX = '.liasnap'
+SNAPSHOT_MAGIC = b'LIASNAP1'
+
+# Filens början: magiska bytes och längden på JSON-huvudet, sedan huvudet och datat
+_PREAMBLE = struct.Struct('>8sI')
+
+# Filer läses och skrivs i block vid kompilering
+COPY_CHUNK = 1024 * 1024
+
+# Skivor skickas i block som bytes - WSGI-servrar tar inte emot memoryview
+SEND_CHUNK = 256 * 1024
+
+
+class ReleaseSnapshot:
+    """En öppnad snapshotfil
+
+    Huvudet innehåller versionens metadata, trädets position och ett index
+    filnamn → [offset, längd, mtime_ns]. Offset räknas från datats början.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, length = _PREAMBLE.unpack_from(self._mm)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.path.name} är ingen snapshotfil")
+            self.header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + length])
+        except Exception:
+            self.close()
+            raise
+        self._data = memoryview(self._mm)[_PREAMBLE.size + length:]
+        self.files: Dict[str, List[int]] = self.header['files']
+        self._tree = None
+        self._tree_lock = threading.Lock()
+
+    @property
+    def folder(self) -> str:
+        return self.header['folder']
+
+    def tree(self) -> Dict:
+        """Returnerar det förbyggda trädet (avkodas vid första anropet)"""
+        with self._tree_lock:
+            if self._tree is None:
+                offset, length = self.header['tree']
+                self._tree = json.loads(self._data[offset:offset + length].tobytes())
+            return self._tree
+
+    def file(self, name: str) -> Optional[Tuple[memoryview, int]]:
+        """Returnerar (skiva av filens bytes, mtime_ns) utan kopiering, eller None"""
+        entry = self.files.get(name)
+        if entry is None:
+            return None
+        offset, length, mtime_ns = entry
+        return self._data[offset:offset + length], mtime_ns
+
+    def close(self) -> None:
+        try:
+            data = getattr(self, '_data', None)
+            if data is not None:
+                data.release()
+            mm = getattr(self, '_mm', None)
+            if mm is not None:
+                mm.close()
+        except BufferError:
+            # En skiva serveras fortfarande - mappningen frigörs när den sista referensen släpps
+            pass
+        self._file.close()
+
+
+class SnapshotStore:
+    """Håller reda på snapshotfiler i en lokal katalog, nycklade på releasemapp
+
+    Katalogen listas vid `refresh` (efter varje skanning), så en förfrågan
+    behöver aldrig fråga filsystemet om en snapshot finns.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._available: Dict[str, Tuple[int, int]] = {}
+        self._open: Dict[str, Tuple[Tuple[int, int], ReleaseSnapshot]] = {}
+        self.hits = 0
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Listar katalogen; ersatta eller borttagna snapshots stängs"""
+        available = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(SNAPSHOT_SUFFIX) and entry.is_file():
+                    st = entry.stat()
+                    available[entry.name[:-len(SNAPSHOT_SUFFIX)]] = (st.st_size, st.st_mtime_ns)
+
+        with self._lock:
+            self._available = available
+            stale = [folder for folder, (sig, _) in self._open.items() if available.get(folder) != sig]
+            closing = [self._open.pop(folder)[1] for folder in stale]
+        for snapshot in closing:
+            snapshot.close()
+
+    def on_scan(self, products: Dict) -> None:
+        """Skanningslyssnare: plockar upp nykompilerade snapshots"""
+        try:
+            self.refresh()
+        except OSError as e:
+            logger.warning("⚠️  Kunde inte lista snapshots i %s: %s", self.directory, e)
+
+    def get(self, folder: str) -> Optional[ReleaseSnapshot]:
+        """Returnerar öppnad snapshot för releasemappen, eller None"""
+        with self._lock:
+            sig = self._available.get(folder)
+            if sig is None:
+                return None
+            opened = self._open.get(folder)
+            if opened is not None and opened[0] == sig:
+                self.hits += 1
+                return opened[1]
+
+        try:
+            snapshot = ReleaseSnapshot(self.directory / f"{folder}{SNAPSHOT_SUFFIX}")
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  Kunde inte öppna snapshot för %s: %s", folder, e)
+            with self._lock:
+                self._available.pop(folder, None)
+            return None
+
+        with self._lock:
+            opened = self._open.get(folder)
+            if opened is not None and opened[0] == sig:
+                # En annan tråd hann före
+                snapshot.close()
+                return opened[1]
+            self._open[folder] = (sig, snapshot)
+            self.hits += 1
+        logger.info("🗃️  Öppnade snapshot för %s (%d filer)", folder, len(snapshot.files))
+        return snapshot
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "directory": str(self.directory),
+                "available": len(self._available),
+                "open": len(self._open),
+                "hits": self.hits
+            }
+
+
+def iter_bytes(data: memoryview, chunk_size: int = SEND_CHUNK) -> Iterator[bytes]:
+    """Delar en skiva i bytes-block för ett strömmat svar; bara ett block i taget kopieras"""
+    for start in range(0, len(data), chunk_size):
+        yield bytes(data[start:start + chunk_size])
+
+
+def write_snapshot(target: Path, meta: Dict, tree: Dict, webview_path: Path) -> Dict:
+    """Skriver en snapshot av alla filer i webview_path plus det byggda trädet
+
+    Filen skrivs först som .part och byts sedan ut, så servern aldrig ser en
+    halvskriven snapshot.
+    """
+    entries = []
+    with os.scandir(webview_path) as listing:
+        for entry in listing:
+            if entry.is_file():
+                st = entry.stat()
+                entries.append((entry.name, st.st_size, st.st_mtime_ns))
+    entries.sort()
+
+    tree_bytes = json.dumps(tree, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    files = {}
+    offset = len(tree_bytes)
+    for name, size, mtime_ns in entries:
+        files[name] = [offset, size, mtime_ns]
+        offset += size
+
+    header = dict(meta, tree=[0, len(tree_bytes)], files=files, created=time.time())
+    header_bytes = json.dumps(header, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + '.part')
+    try:
+        with open(tmp, 'wb') as out:
+            out.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, len(header_bytes)))
+            out.write(header_bytes)
+            out.write(tree_bytes)
+            for name, size, _ in entries:
+                with open(webview_path / name, 'rb') as f:
+                    written = 0
+                    for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+                        out.write(chunk[:size - written])
+                        written += len(chunk)
+                    if written < size:
+                        raise OSError(f"{name} krympte under kompileringen")
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+    return {"files": len(entries), "bytes": offset + len(header_bytes) + _PREAMBLE.size}
+
+
+def compile_version(scanner, product: str, version: str, output: Path) -> Dict:
+    """Bygger trädet från källan och skriver versionens snapshot"""
+    source = scanner.version_source(product, version)
+    if "error" in source:
+        return source
+
+    tree = scanner.build_tree_from_root(product, version, use_cache=False)
+    if "error" in tree:
+        return tree
+
+    meta = {
+        "product": product,
+        "version": version,
+        "folder": source['folder'],
+        "diagrams_sig": list(source['diagrams_sig'])
+    }
+    return write_snapshot(output / f"{source['folder']}{SNAPSHOT_SUFFIX}", meta, tree, source['webview_path'])
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Kompilerar releaseversioner till snapshotfiler")
+    parser.add_argument('product', nargs='?', help="Produkt, t.ex. PS200")
+    parser.add_argument('version', nargs='?', help="Version, t.ex. 1.0.2.5")
+    parser.add_argument('--all', action='store_true', help="Kompilera alla versioner som saknar snapshot")
+    parser.add_argument('--force', action='store_true', help="Skriv över befintliga snapshots")
+    parser.add_argument('--output', help="Snapshotkatalog (standard: SNAPSHOT_DIR)")
+    args = parser.parse_args(argv)
+
+    if not args.all and not (args.product and args.version):
+        parser.error("ange produkt och version, eller --all")
+
+    os.environ.setdefault('SCAN_INTERVAL', '0')
+    os.environ.setdefault('PREWARM_LATEST', '0')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, str(Path(__file__).parent))
+    import app as lia
+
+    output = Path(args.output or lia.SNAPSHOT_DIR)
+    if not str(output):
+        parser.error("SNAPSHOT_DIR är avstängd - ange --output")
+
+    products = lia.scanner.scan_products()
+    if "error" in products:
+        print(f"❌ {products['error']}")
+        return 1
+
+    if args.all:
+        targets = [(product, v['version'], v['folder']) for product, versions in products.items() for v in versions]
+    else:
+        version_data = next((v for v in products.get(args.product, []) if v['version'] == args.version), None)
+        if version_data is None:
+            print(f"❌ {args.product} v{args.version} hittades inte")
+            return 1
+        targets = [(args.product, args.version, version_data['folder'])]
+
+    failed = 0
+    for product, version, folder in targets:
+        if not args.force and (output / f"{folder}{SNAPSHOT_SUFFIX}").exists():
+            print(f"⏭️  {product} v{version} har redan en snapshot")
+            continue
+        start = time.perf_counter()
+        result = compile_version(lia.scanner, product, version, output)
+        if "error" in result:
+            failed += 1
+            print(f"❌ {product} v{version}: {result['error']}")
+            continue
+        print(f"✅ {product} v{version}: {result['files']} filer, {result['bytes'] / 1024 / 1024:.1f} MB "
+              f"({time.perf_counter() - start:.1f} s)")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
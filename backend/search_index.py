@@ -0,0 +1,259 @@
+"""
+Sökindex för Simulink WebView Navigation System
+Inverterat index i minnet med prefixstöd över element i alla diagrams_1.json
+"""
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+from typing import Dict, List, Set, Tuple
+
+from process_local import ProcessLocalExecutor
+
+logger = logging.getLogger('lia.search')
+
+TOKEN_SPLIT = re.compile(r'[^0-9a-zåäö]+')
+
+# Långa värden (t.ex. annoteringar med HTML) indexeras bara delvis
+MAX_VALUE_CHARS = 256
+MAX_WHOLE_TOKEN_CHARS = 64
+
+# Fält i ett dokument (ett element i en nods elements-array)
+DOC_PRODUCT, DOC_VERSION, DOC_SID, DOC_NAME, DOC_LABEL, DOC_FULLNAME, DOC_ICON, DOC_NODE_HID, DOC_HID_PATH = range(9)
+
+
+def tokenize(*values: str) -> Set[str]:
+    """Delar upp värden i gemena ord, plus hela värdet som eget token (t.ex. 'ps200:51722')"""
+    tokens = set()
+    for value in values:
+        if not value:
+            continue
+        lowered = value[:MAX_VALUE_CHARS].lower()
+        if len(value) <= MAX_WHOLE_TOKEN_CHARS:
+            tokens.add(lowered)
+        tokens.update(t for t in TOKEN_SPLIT.split(lowered) if t)
+    return tokens
+
+
+class SearchIndex:
+    """Inverterat index över element i alla produkter och versioner
+
+    Dokument-id:n tilldelas i ordning, så varje version täcker ett
+    sammanhängande id-intervall och kan filtreras utan extra uppslag.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: Dict[int, tuple] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._versions: Dict[Tuple[str, str], range] = {}
+        self._next_id = 0
+        self._sorted_tokens: List[str] = []
+        self._tokens_dirty = False
+
+    def has_version(self, product: str, version: str) -> bool:
+        with self._lock:
+            return (product, version) in self._versions
+
+    def versions(self) -> Set[Tuple[str, str]]:
+        with self._lock:
+            return set(self._versions)
+
+    def index_version(self, product: str, version: str, hierarchy: List[Dict]) -> int:
+        """Indexerar (eller indexerar om) alla element i en versions hierarki"""
+        nodes_by_hid = {node.get('hid'): node for node in hierarchy}
+        nodes_by_sid = {node['sid']: node for node in hierarchy if 'sid' in node}
+        hid_paths: Dict[int, tuple] = {}
+
+        def hid_path(hid) -> tuple:
+            path = hid_paths.get(hid)
+            if path is None:
+                chain = []
+                node = nodes_by_hid.get(hid)
+                while node is not None and len(chain) <= len(nodes_by_hid):
+                    chain.append(node.get('hid'))
+                    node = nodes_by_hid.get(node.get('parent'))
+                path = hid_paths[hid] = tuple(reversed(chain))
+            return path
+
+        docs = []
+        for node in hierarchy:
+            node_hid = node.get('hid')
+            node_fullname = node.get('fullname', node.get('name', ''))
+            for element in node.get('elements', []):
+                name = element.get('name') or ''
+                sid = element.get('sid') or ''
+                path = hid_path(node_hid)
+                child = nodes_by_sid.get(sid)
+                if child is not None and child.get('parent') == node_hid:
+                    path = path + (child.get('hid'),)
+                docs.append((
+                    product, version, sid, name, element.get('label', name),
+                    f"{node_fullname}/{name}", element.get('icon'), node_hid, path
+                ))
+
+        with self._lock:
+            self._remove_version(product, version)
+            start = self._next_id
+            for doc in docs:
+                doc_id = self._next_id
+                self._next_id += 1
+                self._docs[doc_id] = doc
+                for token in tokenize(doc[DOC_SID], doc[DOC_NAME], doc[DOC_LABEL], doc[DOC_FULLNAME]):
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = set()
+                        self._tokens_dirty = True
+                    postings.add(doc_id)
+            self._versions[(product, version)] = range(start, self._next_id)
+        return len(docs)
+
+    def remove_version(self, product: str, version: str) -> None:
+        with self._lock:
+            self._remove_version(product, version)
+
+    def _remove_version(self, product: str, version: str) -> None:
+        ids = self._versions.pop((product, version), None)
+        if ids is None:
+            return
+        for doc_id in ids:
+            doc = self._docs.pop(doc_id, None)
+            if doc is None:
+                continue
+            for token in tokenize(doc[DOC_SID], doc[DOC_NAME], doc[DOC_LABEL], doc[DOC_FULLNAME]):
+                postings = self._postings.get(token)
+                if postings is None:
+                    continue
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[token]
+                    self._tokens_dirty = True
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        """Returnerar alla token som börjar med prefixet (binärsökning i sorterad tokenlista)"""
+        if self._tokens_dirty:
+            self._sorted_tokens = sorted(self._postings)
+            self._tokens_dirty = False
+
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        end = bisect.bisect_left(self._sorted_tokens, prefix + '\uffff', start)
+        return self._sorted_tokens[start:end]
+
+    def search(self, query: str, product: str = None, version: str = None, limit: int = 50) -> List[Dict]:
+        """Söker med prefixmatchning; alla ord i frågan måste matcha
+
+        Det mest selektiva ordet expanderas först, övriga ord filtrerar sedan
+        kandidaterna. Element där något ord matchar ett helt token rankas före
+        rena prefixträffar.
+        """
+        terms = {t for t in TOKEN_SPLIT.split(query.lower()) if t}
+        if not terms:
+            return []
+
+        with self._lock:
+            expanded = []
+            for term in terms:
+                tokens = self._prefix_tokens(term)
+                if not tokens:
+                    return []
+                postings = [self._postings[token] for token in tokens]
+                expanded.append((sum(len(p) for p in postings), term, postings))
+            expanded.sort(key=lambda item: item[0])
+
+            candidates = set().union(*expanded[0][2])
+            for _, _, postings in expanded[1:]:
+                # Få kandidater: slå upp dem direkt istället för att bygga unionen
+                if len(candidates) * len(postings) * 20 < sum(len(p) for p in postings):
+                    candidates = {d for d in candidates if any(d in p for p in postings)}
+                else:
+                    candidates &= set().union(*postings)
+                if not candidates:
+                    return []
+
+            if product is not None:
+                allowed = [ids for (p, v), ids in self._versions.items()
+                           if p == product and (version is None or v == version)]
+                if sum(len(ids) for ids in allowed) < len(candidates):
+                    candidates = {d for ids in allowed for d in ids if d in candidates}
+                else:
+                    candidates = {d for d in candidates if any(d in ids for ids in allowed)}
+
+            exact_postings = [self._postings[t] for t in terms if t in self._postings]
+            ordered = []
+            if exact_postings:
+                exact_hits = set()
+                for postings in exact_postings:
+                    exact_hits |= candidates & postings
+                ordered = heapq.nsmallest(limit, exact_hits)
+                candidates = candidates - exact_hits
+            if len(ordered) < limit:
+                ordered += heapq.nsmallest(limit - len(ordered), candidates)
+
+            return [self._hit(self._docs[doc_id]) for doc_id in ordered]
+
+    def _hit(self, doc: tuple) -> Dict:
+        return {
+            "product": doc[DOC_PRODUCT],
+            "version": doc[DOC_VERSION],
+            "sid": doc[DOC_SID],
+            "name": doc[DOC_NAME],
+            "label": doc[DOC_LABEL],
+            "fullname": doc[DOC_FULLNAME],
+            "icon": doc[DOC_ICON],
+            "node_hid": doc[DOC_NODE_HID],
+            "hid_path": list(doc[DOC_HID_PATH])
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "versions": len(self._versions),
+                "documents": len(self._docs),
+                "tokens": len(self._postings)
+            }
+
+
+class SearchIndexer:
+    """Håller sökindexet i takt med skanningar: nya versioner indexeras i bakgrunden"""
+
+    def __init__(self, scanner, index: SearchIndex):
+        self.scanner = scanner
+        self.index = index
+        self._executor = ProcessLocalExecutor(max_workers=1, thread_name_prefix='search-indexer')
+        self._lock = threading.Lock()
+        self._queued = set()
+
+    def on_scan(self, products: Dict) -> None:
+        """Skanningslyssnare: köar nya versioner och tar bort försvunna"""
+        if not isinstance(products, dict) or "error" in products:
+            return
+
+        current = {(product, v['version']) for product, versions in products.items() for v in versions}
+        for key in self.index.versions() - current:
+            self.index.remove_version(*key)
+
+        with self._lock:
+            for key in current:
+                if key in self._queued or self.index.has_version(*key):
+                    continue
+                self._queued.add(key)
+                self._executor.submit(self._index_version, key)
+
+    def _index_version(self, key: Tuple[str, str]) -> None:
+        product, version = key
+        try:
+            hierarchy = self.scanner.read_hierarchy(product, version)
+            if hierarchy is not None:
+                count = self.index.index_version(product, version, hierarchy)
+                logger.debug("🔎 Indexerade %d element för %s v%s", count, product, version)
+        except Exception as e:
+            logger.warning("⚠️  Kunde inte indexera %s v%s: %s", product, version, e)
+        finally:
+            with self._lock:
+                self._queued.discard(key)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._queued)
@@ -0,0 +1,187 @@
+"""
+Delad cache mellan arbetsprocesser för Simulink WebView Navigation System
+Lokal SQLite-fil där en process bygger (under ett lån) och alla processer på maskinen läser resultatet
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger('lia.shared')
+
+
+class SharedCache:
+    """JSON-poster och bygglån i en SQLite-fil som delas av alla arbetsprocesser
+
+    Under t.ex. gunicorn med flera workers har varje process egna cachar i
+    minnet. `do` ser till att bara en process i taget kör ett bygge för en
+    nyckel: den som får lånet bygger och sparar resultatet, övriga väntar
+    tills lånet släpps och läser sedan posten. Ett lån som inte släpps
+    (processen dog) går ut efter `lease_ttl` sekunder och tas över.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key TEXT PRIMARY KEY,
+            signature TEXT,
+            value TEXT NOT NULL,
+            updated REAL NOT NULL
+        )
+    """
+
+    LEASE_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            key TEXT PRIMARY KEY,
+            owner INTEGER NOT NULL,
+            expires REAL NOT NULL
+        )
+    """
+
+    def __init__(self, db_path: str, lease_ttl: float = 120.0, poll_interval: float = 0.1):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.hits = 0
+        self.builds = 0
+        self.waits = 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute(self.SCHEMA)
+            conn.execute(self.LEASE_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # En anslutning får inte ärvas över fork (t.ex. gunicorn --preload) - varje process öppnar sin egen
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str, signature: Any = None, since: float = None) -> Optional[Any]:
+        """Hämtar en post; med `signature` måste källans signatur stämma, med `since` måste posten vara nyare
+
+        `signature` kan också vara en funktion som räknar ut förväntad
+        signatur ur värdet (när värdet avgör vilka källfiler som ska kontrolleras).
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT signature, value, updated FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        if since is not None and row[2] < since:
+            return None
+        value = json.loads(row[1])
+        if callable(signature):
+            signature = signature(value)
+        if signature is not None and row[0] != json.dumps(signature):
+            return None
+        return value
+
+    def put(self, key: str, value: Any, signature: Any = None) -> None:
+        payload = json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, json.dumps(signature) if signature is not None else None, payload, time.time())
+            )
+
+    def prune(self, prefix: str, keep: Iterable[str]) -> int:
+        """Tar bort poster vars nyckel börjar med `prefix` men inte finns i `keep`, returnerar antal"""
+        keep = set(keep)
+        with self._lock:
+            conn = self._connection()
+            keys = [row[0] for row in conn.execute("SELECT key FROM entries WHERE substr(key, 1, ?) = ?",
+                                                   (len(prefix), prefix))]
+            stale = [(key,) for key in keys if key not in keep]
+            conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        return len(stale)
+
+    def _acquire(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+                acquired = conn.execute("INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                                        (key, os.getpid(), now + self.lease_ttl)).rowcount == 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, os.getpid()))
+
+    def do(self, key: str, fn: Callable[[], Any], signature: Any = None, since: float = None) -> Any:
+        """Returnerar delad post för nyckeln, eller kör `fn` under lånet och delar resultatet
+
+        Resultat med "error" sparas inte - nästa process som får lånet försöker själv.
+        """
+        waited = False
+        while True:
+            value = self.get(key, signature, since)
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                metrics.inc('shared_cache_hits')
+                return value
+
+            if self._acquire(key):
+                try:
+                    # En annan process kan ha blivit klar mellan läsningen och lånet
+                    value = self.get(key, signature, since)
+                    if value is not None:
+                        with self._lock:
+                            self.hits += 1
+                        metrics.inc('shared_cache_hits')
+                        return value
+
+                    with self._lock:
+                        self.builds += 1
+                    value = fn()
+                    if not (isinstance(value, dict) and "error" in value):
+                        self.put(key, value, signature(value) if callable(signature) else signature)
+                    return value
+                finally:
+                    self._release(key)
+
+            if not waited:
+                waited = True
+                with self._lock:
+                    self.waits += 1
+                metrics.inc('shared_cache_waits')
+                logger.debug("⏳ Väntar på att en annan process bygger %s", key)
+            time.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(CAST(value AS BLOB))), 0) FROM entries"
+            ).fetchone()
+            leases = conn.execute("SELECT COUNT(*) FROM leases WHERE expires >= ?", (time.time(),)).fetchone()[0]
+            return {
+                "path": str(self.db_path),
+                "entries": entries,
+                "bytes": size,
+                "leases": leases,
+                "hits": self.hits,
+                "builds": self.builds,
+                "waits": self.waits
+            }
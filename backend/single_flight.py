@@ -0,0 +1,64 @@
+"""
+Sammanslagning av samtidiga anrop för Simulink WebView Navigation System
+Identiska pågående skanningar och trädbyggen körs en gång och delas av alla som väntar
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from metrics import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Kör högst ett anrop per nyckel åt gången; övriga anropare väntar på samma resultat
+
+    Resultatet delas bara med anrop som kom in medan det pågick - nästa
+    anrop efter att det blivit klart kör funktionen igen.
+    """
+
+    def __init__(self, name: str = 'single_flight'):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Kör `fn` för nyckeln, eller väntar in ett redan pågående anrop med samma nyckel"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            metrics.inc(f'{self.name}_coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
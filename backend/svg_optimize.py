@@ -0,0 +1,390 @@
+"""
+SVG-optimering för Simulink WebView Navigation System
+Minifierar WebView-exporterade _d.svg en gång per fil och sparar förkomprimerade gzip/brotli-varianter
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from manifest import safe_relative_name
+from metrics import metrics
+from process_local import ProcessLocalExecutor
+
+try:
+    import brotli
+except ImportError:  # brotli är valfritt - utan det skapas bara gzip-varianten
+    brotli = None
+
+logger = logging.getLogger('lia.svg')
+
+# Innehåll som lämnas orört: CDATA, inbäddad CSS/JS och textelement (där blanksteg syns)
+_RAW_SECTIONS = re.compile(r'(<!\[CDATA\[.*?\]\]>|<style\b.*?</style>|<script\b.*?</script>)', re.S)
+_TEXT_SECTIONS = re.compile(r'(<text\b.*?</text>)', re.S)
+_COMMENT = re.compile(r'<!--.*?-->', re.S)
+_METADATA = re.compile(r'<metadata\b[^>]*/>|<metadata\b.*?</metadata>', re.S)
+_INDENTATION = re.compile(r'(?:(?<=>)|^)\s*\n\s*(?=<|$)')
+# Attributvärden inom citattecken kan innehålla '>' och blanksteg som ska bevaras
+_START_TAG = re.compile(r'(<[A-Za-z](?:[^>"\']|"[^"]*"|\'[^\']*\')*>)')
+_QUOTED = re.compile(r'("[^"]*"|\'[^\']*\')')
+_WHITESPACE = re.compile(r'\s+')
+_STYLE_ATTR = re.compile(r'\sstyle=(["\'])([^"\'<>&{}]*)\1')
+_CLASS_ATTR = re.compile(r'(\sclass=(["\']))([^"\']*)\2')
+_TAG_NAME = re.compile(r'<[\w:.-]+')
+_SVG_ROOT = re.compile(r'<svg\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*(?<!/)>')
+
+# Style-värden som förekommer minst så här många gånger (och är minst så här långa) blir klasser
+MIN_STYLE_REPEATS = 2
+MIN_STYLE_LENGTH = 16
+
+ENCODINGS = ('br', 'gzip')
+
+# Ingår i varianternas filnamn - höjs när minifieringen ändras, så att äldre varianter tas bort vid start
+MINIFIER_VERSION = 2
+
+
+def _collapse_tag(tag: str) -> str:
+    """Slår ihop blanksteg mellan attributen i en starttagg; citerade värden lämnas orörda"""
+    parts = _QUOTED.split(tag)
+    for i in range(0, len(parts), 2):
+        parts[i] = _WHITESPACE.sub(' ', parts[i])
+    parts[-1] = parts[-1].replace(' >', '>').replace(' />', '/>')
+    return ''.join(parts)
+
+
+def minify_svg(data: bytes) -> bytes:
+    """Minifierar en SVG utan att ändra dess rendering eller id-attribut
+
+    Kommentarer, <metadata> och indenteringsblanksteg mellan taggar tas
+    bort och blanksteg i starttaggar slås ihop. Style-attribut som upprepas
+    ersätts med klasser i ett <style>-block, om SVG:n inte redan har egen
+    CSS som klasserna kan krocka med.
+    """
+    text = data.decode('utf-8')
+
+    segments = _RAW_SECTIONS.split(text)
+    for i in range(0, len(segments), 2):
+        segment = _METADATA.sub('', _COMMENT.sub('', segments[i]))
+        parts = _TEXT_SECTIONS.split(segment)
+        for j in range(len(parts)):
+            # Udda delar är starttaggar, jämna är innehållet mellan dem
+            pieces = _START_TAG.split(parts[j])
+            for k in range(len(pieces)):
+                if k % 2:
+                    pieces[k] = _collapse_tag(pieces[k])
+                elif j % 2 == 0:
+                    pieces[k] = _INDENTATION.sub('', pieces[k])
+            parts[j] = ''.join(pieces)
+        segments[i] = ''.join(parts)
+
+    if len(segments) == 1:
+        segments[0] = _extract_style_classes(segments[0], hashlib.sha1(data).hexdigest()[:6])
+
+    return ''.join(segments).strip().encode('utf-8')
+
+
+def _extract_style_classes(text: str, prefix: str) -> str:
+    """Ersätter upprepade style-attribut med klasser (namnen är unika per fil)"""
+    counts = Counter(match.group(2) for match in _STYLE_ATTR.finditer(text))
+    repeated = [value for value, count in counts.most_common()
+                if count >= MIN_STYLE_REPEATS and len(value) >= MIN_STYLE_LENGTH]
+    if not repeated:
+        return text
+
+    root = _SVG_ROOT.search(text)
+    if root is None:
+        return text
+
+    classes = {value: f"s{prefix}-{i}" for i, value in enumerate(repeated)}
+
+    def replace_tag(match) -> str:
+        tag = match.group(0)
+        style = _STYLE_ATTR.search(tag)
+        if style is None or style.group(2) not in classes:
+            return tag
+        name = classes[style.group(2)]
+        tag = tag[:style.start()] + tag[style.end():]
+        existing = _CLASS_ATTR.search(tag)
+        if existing is not None:
+            return f"{tag[:existing.start(3)]}{existing.group(3)} {name}{tag[existing.end(3):]}"
+        head = _TAG_NAME.match(tag).end()
+        return f'{tag[:head]} class="{name}"{tag[head:]}'
+
+    body = _START_TAG.sub(replace_tag, text[root.end():])
+    rules = ''.join(f".{name}{{{value}}}" for value, name in classes.items())
+    return f"{text[:root.end()]}<style>{rules}</style>{body}"
+
+
+def choose_encoding(accept_encoding: str, available: List[str]) -> Optional[str]:
+    """Väljer bästa tillgängliga kodning ur Accept-Encoding (br före gzip, q=0 respekteras)"""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class SvgOptimizer:
+    """Lokal cache av optimerade SVG:er per releasemapp
+
+    Varje fil optimeras en gång i bakgrunden efter första visningen; tills
+    dess serveras originalet. Varianterna sparas på disk som
+    <namn>@<storlek>-<mtime_ns>-<minifierarversion>, med .gz och (med brotli installerat) .br
+    bredvid, så en omskriven källfil aldrig matchar en gammal variant.
+    Katalogen hålls under `max_bytes` genom att minst nyligen använda filer vräks.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, workers: int = 2, gzip_level: int = 9,
+                 brotli_quality: int = 9, revalidate_after: float = 2.0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.revalidate_after = revalidate_after
+        self._executor = ProcessLocalExecutor(max_workers=max(1, workers), thread_name_prefix='svg-optimize')
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        # (mapp, namn) -> [källsignatur, bytes på disk, kodningar], äldst använd först
+        self._entries: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        # (mapp, namn) -> (källsignatur, när källan senast stat:ades)
+        self._checked: Dict[Tuple[str, str], Tuple[Tuple[int, int], float]] = {}
+        self.total_bytes = 0
+        self.optimized = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        """Läser in redan optimerade filer, äldst använda först; filer utan signatur i namnet tas bort"""
+        found = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                rel = path.relative_to(self.root)
+                parsed = _parse_variant('/'.join(rel.parts[1:])) if len(rel.parts) >= 2 else None
+                if parsed is None:
+                    _unlink(path)
+                    continue
+                name, sig, encoding = parsed
+                entry = found.setdefault((rel.parts[0], name, sig), [0, 0, []])
+                entry[1] += st.st_size
+                if encoding == 'identity':
+                    entry[0] = st.st_atime
+                else:
+                    entry[2].append(encoding)
+
+        for (folder, name, sig), (atime, size, encodings) in sorted(found.items(), key=lambda item: item[1][0]):
+            key = (folder, name)
+            if not atime or key in self._entries:
+                # Basfilen saknas (avbruten optimering) eller en äldre signatur finns kvar
+                self._remove_files(folder, name, sig, encodings)
+                continue
+            self._entries[key] = [sig, size, tuple(encodings)]
+            self.total_bytes += size
+        self._evict()
+
+    def _base(self, folder: str, name: str, sig: Tuple[int, int]) -> Path:
+        return self.root / folder / f"{name}@{sig[0]:x}-{sig[1]:x}-{MINIFIER_VERSION:x}"
+
+    def _source_signature(self, key: Tuple[str, str], source) -> Optional[Tuple[int, int]]:
+        """Källans (storlek, mtime_ns); en sökväg stat:as högst en gång per `revalidate_after` sekunder"""
+        if isinstance(source, tuple):
+            return source
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checked.get(key)
+        if checked is not None and now - checked[1] < self.revalidate_after:
+            return checked[0]
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        sig = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            self._checked[key] = (sig, now)
+        return sig
+
+    def lookup(self, folder: str, name: str, source) -> Optional[Dict[str, Path]]:
+        """Returnerar {kodning eller 'identity': sökväg} för en optimerad fil, annars None
+
+        `source` är källfilens sökväg eller dess (storlek, mtime_ns); varianter
+        från en annan version av källfilen används inte.
+        """
+        if not safe_relative_name(name):
+            return None
+        key = (folder, name)
+        sig = self._source_signature(key, source)
+        with self._lock:
+            entry = self._entries.get(key)
+            if sig is None or entry is None or entry[0] != sig:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            encodings = entry[2]
+
+        base = self._base(folder, name, sig)
+        variants = {'identity': base}
+        for encoding in encodings:
+            variants[encoding] = base.with_name(base.name + _SUFFIXES[encoding])
+        return variants
+
+    def schedule(self, folder: str, name: str, source, sig: Tuple[int, int]) -> None:
+        """Optimerar en fil i bakgrunden (dubbletter ignoreras)
+
+        `source` är en sökväg eller redan lästa bytes, `sig` källans (storlek, mtime_ns).
+        """
+        if not safe_relative_name(name):
+            return
+        key = (folder, name)
+        sig = tuple(sig)
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[0] == sig) or key in self._in_flight:
+                return
+            self._in_flight.add(key)
+        self._executor.submit(self._optimize, key, source, sig)
+
+    def _optimize(self, key: Tuple[str, str], source, sig: Tuple[int, int]) -> None:
+        base = self._base(key[0], key[1], sig)
+        try:
+            if isinstance(source, bytes):
+                original = source
+            else:
+                with open(source, 'rb') as f:
+                    original = f.read()
+            minified = minify_svg(original)
+
+            outputs = {'identity': minified,
+                       'gzip': gzip.compress(minified, compresslevel=self.gzip_level, mtime=0)}
+            if brotli is not None:
+                outputs['br'] = brotli.compress(minified, quality=self.brotli_quality)
+
+            base.parent.mkdir(parents=True, exist_ok=True)
+            # Komprimerade varianter först - basfilen är markören för att optimeringen är klar
+            for encoding in sorted(outputs, key=lambda e: e == 'identity'):
+                target = base.with_name(base.name + _SUFFIXES[encoding])
+                tmp = target.with_name(target.name + '.part')
+                with open(tmp, 'wb') as f:
+                    f.write(outputs[encoding])
+                os.replace(tmp, target)
+
+            size = sum(len(data) for data in outputs.values())
+            with self._lock:
+                previous = self._entries.pop(key, None)
+                self._entries[key] = [sig, size, tuple(e for e in outputs if e != 'identity')]
+                self.total_bytes += size - (previous[1] if previous is not None else 0)
+                self.optimized += 1
+                self.bytes_in += len(original)
+                self.bytes_out += len(minified)
+            if previous is not None and previous[0] != sig:
+                self._remove_files(key[0], key[1], previous[0], previous[2])
+            self._evict()
+
+            metrics.inc('svg_optimized')
+            logger.debug("🗜️  Optimerade %s: %d → %d bytes (gzip %d)", key[1], len(original), len(minified),
+                         len(outputs['gzip']))
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("⚠️  Kunde inte optimera %s: %s", key[1], e)
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def _remove_files(self, folder: str, name: str, sig: Tuple[int, int], encodings) -> None:
+        base = self._base(folder, name, sig)
+        for encoding in ('identity',) + tuple(encodings):
+            _unlink(base.with_name(base.name + _SUFFIXES[encoding]))
+
+    def _evict(self) -> None:
+        """Vräker minst nyligen använda optimeringar tills katalogen ryms i max_bytes"""
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes or not self._entries:
+                    return
+                key, (sig, size, encodings) = self._entries.popitem(last=False)
+                self.total_bytes -= size
+                self.evictions += 1
+            self._remove_files(key[0], key[1], sig, encodings)
+
+    def on_scan(self, products: Dict) -> None:
+        """Skanningslyssnare: glömmer källsignaturer för releasemappar som inte längre finns"""
+        if not isinstance(products, dict) or "error" in products:
+            return
+
+        keep_folders = {v['folder'] for versions in products.values() for v in versions}
+        with self._lock:
+            for key in [key for key in self._checked if key[0] not in keep_folders]:
+                del self._checked[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "optimized": self.optimized,
+                "files": len(self._entries),
+                "disk_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "brotli": brotli is not None
+            }
+
+
+_SUFFIXES = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+
+
+def _parse_variant(filename: str) -> Optional[Tuple[str, Tuple[int, int], str]]:
+    """Tolkar <namn>@<storlek>-<mtime_ns>-<version>[.gz|.br] till (namn, signatur, kodning), annars None
+
+    Varianter från en annan minifierarversion ger också None.
+    """
+    encoding = 'identity'
+    for candidate, suffix in _SUFFIXES.items():
+        if suffix and filename.endswith(suffix):
+            encoding, filename = candidate, filename[:-len(suffix)]
+            break
+    name, _, sig = filename.rpartition('@')
+    try:
+        size, mtime_ns, version = (int(part, 16) for part in sig.split('-'))
+    except ValueError:
+        return None
+    if version != MINIFIER_VERSION:
+        return None
+    return (name, (size, mtime_ns), encoding) if name else None
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
@@ -0,0 +1,92 @@
+"""
+Tester för releasesnapshots
+Kompilerar en liten release och hämtar filerna genom Flask-appen
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+_tmp = tempfile.mkdtemp(prefix='lia-snapshot-test-')
+_releases = Path(_tmp) / 'releases'
+_snapshots = Path(_tmp) / 'snapshots'
+
+# Appen läser konfigurationen vid import
+os.environ.update({
+    'RELEASES_DIR': str(_releases),
+    'SNAPSHOT_DIR': str(_snapshots),
+    'SCAN_INTERVAL': '0',
+    'PREWARM_LATEST': '0',
+    'MIRROR_DIR': '',
+    'TREE_INDEX_PATH': '',
+    'SHARED_CACHE_PATH': '',
+    'SVG_OPTIMIZE_DIR': '',
+})
+
+WEBVIEW = _releases / 'PS200_1.0.0.1' / 'WebView_PS200' / 'support' / 'slwebview_files'
+WEBVIEW.mkdir(parents=True)
+HIERARCHY = [{"hid": 1, "sid": "PS200", "parent": 0, "children": [], "name": "PS200",
+              "svg": "support/slwebview_files/PS200_d.svg", "elements": []}]
+(WEBVIEW / 'PS200_diagrams_1.json').write_text(json.dumps(HIERARCHY))
+# Större än ett sändblock så att svaret delas upp
+SVG = ('<svg xmlns="http://www.w3.org/2000/svg">' + '<rect width="1"/>' * 40000 + '</svg>').encode('utf-8')
+(WEBVIEW / 'PS200_d.svg').write_bytes(SVG)
+
+import app as lia  # noqa: E402
+from release_snapshot import SEND_CHUNK, compile_version  # noqa: E402
+
+
+class SnapshotServingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        lia.scanner.scan_products()
+        result = compile_version(lia.scanner, 'PS200', '1.0.0.1', _snapshots)
+        assert "error" not in result, result
+        lia.snapshot_store.refresh()
+        assert lia.scanner.snapshot_for('PS200', '1.0.0.1') is not None
+        cls.client = lia.app.test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(_tmp, ignore_errors=True)
+
+    def test_svg_from_snapshot(self):
+        self.assertGreater(len(SVG), SEND_CHUNK)
+        response = self.client.get('/api/product/PS200/version/1.0.0.1/file/PS200_d.svg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), SVG)
+        self.assertEqual(response.content_length, len(SVG))
+
+    def test_body_is_bytes(self):
+        # WSGI (PEP 3333) kräver bytes - gunicorn och werkzeug avvisar memoryview
+        environ = EnvironBuilder(path='/api/product/PS200/version/1.0.0.1/file/PS200_d.svg').get_environ()
+        app_iter, status, headers = run_wsgi_app(lia.app, environ)
+        try:
+            chunks = list(app_iter)
+        finally:
+            app_iter.close()
+        self.assertTrue(status.startswith('200'))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(type(chunk) is bytes for chunk in chunks))
+        self.assertEqual(b''.join(chunks), SVG)
+
+    def test_hierarchy_from_snapshot(self):
+        response = self.client.get('/api/product/PS200/version/1.0.0.1/file/PS200_diagrams_1.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.get_data()), HIERARCHY)
+
+    def test_not_modified(self):
+        url = '/api/product/PS200/version/1.0.0.1/file/PS200_d.svg'
+        etag = self.client.get(url).headers['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
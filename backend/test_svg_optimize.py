@@ -0,0 +1,84 @@
+"""
+Tester för SVG-optimering
+"""
+
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from svg_optimize import MINIFIER_VERSION, SvgOptimizer, minify_svg
+
+
+def _attributes(svg: bytes):
+    """(attribut, värde) i dokumentordning - blanksteg mellan attributen spelar ingen roll"""
+    return re.findall(r'([\w:-]+)="([^"]*)"', svg.decode('utf-8'))
+
+
+class MinifySvgTest(unittest.TestCase):
+
+    def test_quoted_values_are_preserved(self):
+        source = (b'<svg xmlns="http://www.w3.org/2000/svg">\n'
+                  b'  <g   id="a"\n     title="a > b   c">\n'
+                  b'    <path d="M 0 0\n      L 10   10" />\n'
+                  b"    <polygon points='0,0   5,5' />\n"
+                  b'    <meta   content="x  >  y"/>\n'
+                  b'  </g>\n</svg>\n')
+        result = minify_svg(source)
+        self.assertEqual(_attributes(result), _attributes(source))
+        self.assertIn(b"points='0,0   5,5'", result)
+        self.assertIn(b'<g id="a" title="a > b   c">', result)
+        self.assertIn(b'<path d="M 0 0\n      L 10   10"/>', result)
+        self.assertNotIn(b'\n  <', result)
+
+    def test_repeated_styles_become_classes(self):
+        style = 'fill:#ffffff;stroke:#000000'
+        source = ('<svg xmlns="http://www.w3.org/2000/svg" data-x="1 > 0">'
+                  + f'<rect title="w > h" style="{style}"/>' * 3 + '</svg>').encode('utf-8')
+        result = minify_svg(source).decode('utf-8')
+        self.assertNotIn('style="', result)
+        self.assertIn('data-x="1 > 0"><style>', result)
+        self.assertEqual(result.count(' title="w > h"/>'), 3)
+        self.assertEqual(result.count('<rect class="'), 3)
+
+    def test_text_keeps_whitespace(self):
+        source = b'<svg>\n  <text x="1">  a   b  </text>\n</svg>'
+        self.assertIn(b'<text x="1">  a   b  </text>', minify_svg(source))
+
+
+class SvgOptimizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix='lia-svg-test-'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_variants_from_other_minifier_version_are_removed(self):
+        folder = self.tmp / 'PS200_1.0.0.1'
+        folder.mkdir()
+        old = folder / 'PS200_d.svg@10-20'
+        old.write_bytes(b'<svg/>')
+        current = folder / f'PS200_d.svg@10-20-{MINIFIER_VERSION:x}'
+        current.write_bytes(b'<svg/>')
+        optimizer = SvgOptimizer(str(self.tmp), workers=1)
+        self.assertFalse(old.exists())
+        self.assertEqual(optimizer.lookup('PS200_1.0.0.1', 'PS200_d.svg', (0x10, 0x20))['identity'], current)
+
+    def test_schedule_writes_minified_variant(self):
+        optimizer = SvgOptimizer(str(self.tmp / 'svg'), workers=1)
+        data = b'<svg>\n  <g title="a > b"  >\n  </g>\n</svg>'
+        optimizer.schedule('PS200_1.0.0.1', 'PS200_d.svg', data, (len(data), 1))
+        deadline = time.monotonic() + 5
+        variants = None
+        while variants is None and time.monotonic() < deadline:
+            variants = optimizer.lookup('PS200_1.0.0.1', 'PS200_d.svg', (len(data), 1))
+            time.sleep(0.01)
+        self.assertIsNotNone(variants)
+        self.assertEqual(variants['identity'].read_bytes(), b'<svg><g title="a > b"></g></svg>')
+
+
+if __name__ == '__main__':
+    unittest.main()
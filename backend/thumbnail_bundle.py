@@ -0,0 +1,61 @@
+"""
+Miniatyrbuntar för Simulink WebView Navigation System
+Packar en versions (eller ett delträds) thumbnail-bilder i ett binärt svar med offsetindex
+"""
+
+import json
+import struct
+from typing import Dict, Iterable, List, Tuple
+
+BUNDLE_MIMETYPE = 'application/vnd.lia.thumbnails'
+
+# Buntens början: fyra bytes (big-endian) med indexets längd, sedan JSON-indexet och bilddatat
+_HEADER = struct.Struct('>I')
+
+_IMAGE_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'svg': 'image/svg+xml'
+}
+
+
+def thumbnail_file(node: Dict):
+    """Returnerar filnamnet för nodens thumbnail (samma regel som för svg), eller None"""
+    thumbnail = node.get('thumbnail')
+    return thumbnail.split('/')[-1] if thumbnail else None
+
+
+def image_type(name: str) -> str:
+    return _IMAGE_TYPES.get(name.rsplit('.', 1)[-1].lower(), 'application/octet-stream')
+
+
+def pack_bundle(meta: Dict, nodes: Iterable[Tuple[int, str]], blobs: Dict[str, bytes]) -> bytes:
+    """Packar bilderna i en bunt
+
+    Indexet mappar hid till [offset, längd, typ] i bilddatat (offset räknas
+    från bilddatats början). Noder som delar fil pekar på samma bytes;
+    noder vars fil saknas listas under missing.
+    """
+    offsets: Dict[str, List] = {}
+    chunks = []
+    position = 0
+    thumbnails = {}
+    missing = []
+    for hid, name in nodes:
+        data = blobs.get(name)
+        if data is None:
+            missing.append(hid)
+            continue
+        entry = offsets.get(name)
+        if entry is None:
+            entry = offsets[name] = [position, len(data), image_type(name)]
+            chunks.append(data)
+            position += len(data)
+        thumbnails[str(hid)] = entry
+
+    index = dict(meta, count=len(thumbnails), bytes=position, thumbnails=thumbnails, missing=missing)
+    encoded = json.dumps(index, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return b''.join([_HEADER.pack(len(encoded)), encoded] + chunks)
+
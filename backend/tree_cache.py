@@ -0,0 +1,126 @@
+"""
+Begränsad trädcache för Simulink WebView Navigation System
+LRU-cache med minnesbudget, storleksuppskattning per post och signaturbaserad invalidering
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def estimate_size(value: Any) -> int:
+    """Uppskattar minnesanvändning för en JSON-liknande struktur i bytes"""
+    total = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return total
+
+
+class TreeCache:
+    """LRU-cache med gräns för antal poster och total uppskattad storlek
+
+    Varje post sparas tillsammans med källans signatur (t.ex. storlek/mtime
+    för diagrams_1.json) och kastas när signaturen inte längre stämmer.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, signature: Any = None) -> Optional[Any]:
+        """Hämtar post; med `signature` kastas posten om den byggts från en annan källversion"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if signature is not None and entry[0] != signature:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Hämtar post utan signaturkontroll eller påverkan på räknare/LRU-ordning"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def put(self, key: Hashable, value: Any, signature: Any = None, size: int = None) -> None:
+        """Lägger in en post och vräker äldsta poster tills budgeten håller"""
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (signature, value, size)
+            self.total_bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """Tar bort en post (eller alla)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.total_bytes = 0
+            elif key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def stats(self) -> Dict:
+        """Returnerar storlek och träff-/miss-/vräkningsräknare"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,197 @@
+"""
+Kompakt trådformat för navigeringsträdet
+Platt, hid-indexerad tabell med internerade strängar där härledda fält utelämnas
+"""
+
+from typing import Dict, List
+
+COMPACT_FORMAT = 'compact-1'
+COMPACT_MIMETYPE = 'application/vnd.lia.tree-compact+json'
+
+# Kolumnordning i kompakta rader
+NODE_FIELDS = ['hid', 'parent', 'name', 'label', 'fullname', 'sid', 'className', 'icon', 'svg', 'json', 'clickable']
+CLICKABLE_FIELDS = ['sid', 'name', 'label', 'icon', 'hid', 'hierarchy_type']
+
+
+def _sid_filename(sid: str, suffix: str) -> str:
+    """PS200:51722 → PS200_51722_d.svg (samma regel som trädbygget)"""
+    if not sid or ':' not in sid:
+        return None
+    product_prefix, sid_number = sid.split(':')[:2]
+    return f"{product_prefix}_{sid_number}{suffix}"
+
+
+def _json_from_svg(svg: str) -> str:
+    return svg[:-len('.svg')] + '.json' if svg and svg.endswith('.svg') else None
+
+
+class _StringTable:
+    """Internerar strängar till index i en delad tabell"""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def compact_tree(tree: Dict) -> Dict:
+    """Kodar ett träd från build_tree_from_root till kompakt format
+
+    Utelämnade (härledbara) fält: svg_path/json_path (= svg/json), product
+    (toppnivå), level och is_root (från parent-kedjan), children (från
+    parent + radordning), json när den följer av svg, label när den är lika
+    med name, samt för klickbara element svg/json, has_children och
+    external_hierarchy som alla följer av sid, name och hierarchy_type.
+    Externa hierarkier kodas som egna radlistor med samma strängtabell.
+    """
+    intern = _StringTable()
+    payload = {
+        "format": COMPACT_FORMAT,
+        "product": tree.get('product'),
+        "node_fields": NODE_FIELDS,
+        "clickable_fields": CLICKABLE_FIELDS,
+        "strings": intern.strings,
+        "nodes": _compact_nodes(tree, intern)
+    }
+
+    externals = tree.get('external_hierarchies')
+    if externals:
+        payload['external_hierarchies'] = {
+            filename: _compact_nodes(subtree, intern) for filename, subtree in externals.items()
+        }
+    for key in ('external_cycles', 'external_errors'):
+        if key in tree:
+            payload[key] = tree[key]
+    return payload
+
+
+def _compact_nodes(tree: Dict, intern: _StringTable) -> List[list]:
+    """Kodar ett (del)träd till rader i förordning"""
+    nodes = []
+    stack = [(tree, 0)]
+    while stack:
+        node, parent_hid = stack.pop()
+        name = node.get('name')
+        svg = node.get('svg')
+        json_name = node.get('json')
+
+        clickable = []
+        for element in node.get('clickable_elements', []):
+            element_name = element.get('name')
+            element_label = element.get('label')
+            clickable.append([
+                intern(element.get('sid')),
+                intern(element_name),
+                None if element_label == element_name else intern(element_label),
+                intern(element.get('icon')),
+                element.get('hid'),
+                intern(element.get('hierarchy_type'))
+            ])
+
+        label = node.get('label')
+        fullname = node.get('fullname')
+        nodes.append([
+            node.get('hid'),
+            parent_hid,
+            intern(name),
+            None if label == name else intern(label),
+            None if fullname == name else intern(fullname),
+            intern(node.get('sid')),
+            intern(node.get('className')),
+            intern(node.get('icon')),
+            intern(svg),
+            None if json_name == _json_from_svg(svg) else intern(json_name),
+            clickable
+        ])
+
+        # Förordning: lägg barnen omvänt på stacken så att ordningen bevaras
+        for child in reversed(node.get('children', [])):
+            stack.append((child, node.get('hid')))
+
+    return nodes
+
+
+def expand_compact_tree(data: Dict) -> Dict:
+    """Avkodar kompakt format till samma nästlade struktur som /tree returnerar"""
+    strings = data['strings']
+    root = _expand_nodes(data['nodes'], strings, data.get('product'))
+
+    externals = data.get('external_hierarchies')
+    if externals:
+        # Externa hierarkiers rötter bär modellnamnet som produkt, precis som vid trädbygget
+        root['external_hierarchies'] = {
+            filename: _expand_nodes(rows, strings, filename[:-len('_diagrams_1.json')])
+            for filename, rows in externals.items()
+        }
+    for key in ('external_cycles', 'external_errors'):
+        if key in data:
+            root[key] = data[key]
+    return root
+
+
+def _expand_nodes(rows: List[list], strings: List[str], product: str) -> Dict:
+    def s(index):
+        return None if index is None else strings[index]
+
+    by_hid = {}
+    root = None
+    for hid, parent_hid, name_i, label_i, fullname_i, sid_i, class_i, icon_i, svg_i, json_i, clickable in rows:
+        parent = by_hid.get(parent_hid)
+        level = parent['level'] + 1 if parent is not None else 0
+        name = s(name_i)
+        svg = s(svg_i)
+        json_name = _json_from_svg(svg) if json_i is None else s(json_i)
+
+        elements = []
+        for sid_i_, name_i_, label_i_, icon_i_, element_hid, type_i in clickable:
+            element_sid = s(sid_i_)
+            element_name = s(name_i_)
+            hierarchy_type = s(type_i)
+            element = {
+                'sid': element_sid,
+                'name': element_name,
+                'label': element_name if label_i_ is None else s(label_i_),
+                'icon': s(icon_i_),
+                'svg': _sid_filename(element_sid, '_d.svg'),
+                'json': _sid_filename(element_sid, '_d.json'),
+                'hid': element_hid,
+                'has_children': hierarchy_type in ('internal', 'external'),
+                'hierarchy_type': hierarchy_type
+            }
+            if hierarchy_type == 'external':
+                element['external_hierarchy'] = f"{element_name}_diagrams_1.json"
+            elements.append(element)
+
+        node = {
+            "name": name,
+            "label": name if label_i is None else s(label_i),
+            "fullname": name if fullname_i is None else s(fullname_i),
+            "hid": hid,
+            "sid": s(sid_i),
+            "className": s(class_i),
+            "icon": s(icon_i),
+            "svg": svg,
+            "json": json_name,
+            "svg_path": svg,
+            "json_path": json_name,
+            "children": [],
+            "level": level,
+            "is_root": level == 0,
+            "product": product,
+            "clickable_elements": elements
+        }
+        by_hid[hid] = node
+        if parent is None:
+            root = node
+        else:
+            parent['children'].append(node)
+
+    return root
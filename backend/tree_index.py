@@ -0,0 +1,157 @@
+"""
+Persistent trädindex för Simulink WebView Navigation System
+Sparar byggda navigeringsträd i en lokal SQLite-fil så att de överlever omstarter
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def file_signature(path: Path) -> Tuple[int, int]:
+    """Returnerar (storlek, mtime_ns) för en fil - kastar OSError om den saknas"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def probe_digest(results: Dict[str, bool]) -> str:
+    """Beräknar en stabil hash över vilka probade filer som finns"""
+    h = hashlib.sha1()
+    for name in sorted(results):
+        h.update(f"{name}={int(results[name])}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+class TreeIndex:
+    """SQLite-baserat index över byggda träd, nycklat på produkt och version"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS trees (
+            product TEXT NOT NULL,
+            version TEXT NOT NULL,
+            diagrams_size INTEGER NOT NULL,
+            diagrams_mtime_ns INTEGER NOT NULL,
+            dir_mtime_ns INTEGER NOT NULL,
+            probe_digest TEXT NOT NULL,
+            probes TEXT NOT NULL,
+            tree TEXT NOT NULL,
+            built_at REAL NOT NULL,
+            externals TEXT NOT NULL DEFAULT '[]',
+            PRIMARY KEY (product, version)
+        )
+    """
+
+    HASH_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest TEXT NOT NULL
+        )
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute(self.HASH_SCHEMA)
+        # Index skapade före externa hierarkier saknar kolumnen för deras signaturer
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(trees)")]
+        if 'externals' not in columns:
+            self._conn.execute("ALTER TABLE trees ADD COLUMN externals TEXT NOT NULL DEFAULT '[]'")
+        self._conn.commit()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # En anslutning får inte ärvas över fork (t.ex. gunicorn --preload) - varje process öppnar sin egen
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, product: str, version: str) -> Optional[Dict]:
+        """Hämtar indexrad för produkt/version, eller None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT diagrams_size, diagrams_mtime_ns, dir_mtime_ns, probe_digest, probes, tree, externals "
+                "FROM trees WHERE product = ? AND version = ?",
+                (product, version)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'diagrams_size': row[0],
+            'diagrams_mtime_ns': row[1],
+            'dir_mtime_ns': row[2],
+            'probe_digest': row[3],
+            'probes': json.loads(row[4]),
+            'tree': row[5],
+            'externals': json.loads(row[6])
+        }
+
+    def put(self, product: str, version: str, diagrams_sig: Tuple[int, int], dir_mtime_ns: int,
+            probe_results: Dict[str, bool], tree: Dict, externals: List = ()) -> None:
+        """Sparar ett byggt träd tillsammans med källfilernas signatur
+
+        `externals` är [filnamn, storlek, mtime_ns] för varje extern hierarki i trädet.
+        """
+        payload = json.dumps(tree, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO trees (product, version, diagrams_size, diagrams_mtime_ns, dir_mtime_ns, "
+                "probe_digest, probes, tree, built_at, externals) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (product, version, diagrams_sig[0], diagrams_sig[1], dir_mtime_ns,
+                 probe_digest(probe_results), json.dumps(sorted(probe_results)), payload, time.time(),
+                 json.dumps([list(entry) for entry in externals]))
+            )
+            self._conn.commit()
+
+    def touch_dir_mtime(self, product: str, version: str, dir_mtime_ns: int) -> None:
+        """Uppdaterar katalogens mtime när probe-mängden visat sig vara oförändrad"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE trees SET dir_mtime_ns = ? WHERE product = ? AND version = ?",
+                (dir_mtime_ns, product, version)
+            )
+            self._conn.commit()
+
+    def delete(self, product: str, version: str) -> None:
+        """Tar bort ett träd ur indexet"""
+        with self._lock:
+            self._conn.execute("DELETE FROM trees WHERE product = ? AND version = ?", (product, version))
+            self._conn.commit()
+
+    def keys(self) -> Iterable[Tuple[str, str]]:
+        """Listar alla (produkt, version) som finns i indexet"""
+        with self._lock:
+            return self._conn.execute("SELECT product, version FROM trees").fetchall()
+
+    def get_file_hashes(self, paths: Iterable[str]) -> Dict[str, Tuple[int, int, str]]:
+        """Hämtar sparade innehållshashar som {sökväg: (storlek, mtime_ns, digest)}"""
+        paths = list(paths)
+        found = {}
+        with self._lock:
+            # SQLite begränsar antalet parametrar per fråga
+            for i in range(0, len(paths), 500):
+                chunk = paths[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT path, size, mtime_ns, digest FROM file_hashes WHERE path IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((row[0], (row[1], row[2], row[3])) for row in rows)
+        return found
+
+    def put_file_hashes(self, rows: Iterable[Tuple[str, int, int, str]]) -> None:
+        """Sparar innehållshashar som (sökväg, storlek, mtime_ns, digest)"""
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
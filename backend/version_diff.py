@@ -0,0 +1,194 @@
+"""
+Versionsjämförelse för Simulink WebView Navigation System
+Jämför två versioners diagrams_1.json per sid och flaggar ändrade diagram via innehållshashar
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from metrics import metrics
+from process_local import ProcessLocalExecutor
+from tree_cache import TreeCache
+from tree_index import TreeIndex, file_signature
+
+HASH_CHUNK = 1024 * 1024
+
+# Filer per trådpoolsuppgift - en uppgift per fil kostar mer än själva stat-anropet
+HASH_BATCH = 256
+
+
+def diagram_files(node: Dict, product: str) -> List[str]:
+    """Returnerar nodens _d.svg och _d.json (samma regel som trädbygget)"""
+    svg_path = node.get('svg', '')
+    sys_view_url = node.get('sysViewURL', '')
+    return [
+        svg_path.split('/')[-1] if svg_path else f"{product}_d.svg",
+        sys_view_url.split('/')[-1] if sys_view_url else f"{product}_d.json"
+    ]
+
+
+class ContentHasher:
+    """Beräknar och cachar innehållshashar (sha1) för diagramfiler
+
+    Varje fils hash sparas med filens (storlek, mtime_ns) - i minnet och, om
+    ett trädindex finns, i SQLite så att den överlever omstarter. En versions
+    hela hashtabell cachas dessutom per katalogsignatur, så upprepade
+    jämförelser inte ens behöver stat:a filerna.
+    """
+
+    def __init__(self, tree_index: TreeIndex = None, workers: int = 8, max_versions: int = 32):
+        self.tree_index = tree_index
+        self._executor = ProcessLocalExecutor(max_workers=max(1, workers), thread_name_prefix='content-hash')
+        self._versions = TreeCache(max_entries=max_versions)
+
+    def version_hashes(self, key: str, webview_path: Path, names: Iterable[str], stamp) -> Dict[str, str]:
+        """Returnerar {filnamn: digest} för de givna filerna i en version"""
+        cached = self._versions.get(key, stamp)
+        if cached is not None:
+            return cached
+
+        names = sorted(set(names))
+        base = str(webview_path)
+        paths = [os.path.join(base, name) for name in names]
+        known = self.tree_index.get_file_hashes(paths) if self.tree_index is not None else {}
+
+        def hash_batch(batch: List[str]):
+            return [self._hash_file(path, known.get(path)) for path in batch]
+
+        batches = [paths[i:i + HASH_BATCH] for i in range(0, len(paths), HASH_BATCH)]
+        results = (result for batch in self._executor.map(hash_batch, batches) for result in batch)
+
+        hashes = {}
+        new_rows = []
+        for name, (digest, row) in zip(names, results):
+            if digest is not None:
+                hashes[name] = digest
+            if row is not None:
+                new_rows.append(row)
+
+        if new_rows and self.tree_index is not None:
+            self.tree_index.put_file_hashes(new_rows)
+
+        self._versions.put(key, hashes, stamp)
+        return hashes
+
+    def _hash_file(self, path: str, known: Tuple[int, int, str] = None):
+        """Returnerar (digest, ny indexrad eller None); (None, None) om filen saknas"""
+        try:
+            size, mtime_ns = file_signature(path)
+        except OSError:
+            return None, None
+
+        if known is not None and known[:2] == (size, mtime_ns):
+            return known[2], None
+
+        h = hashlib.sha1()
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                    h.update(chunk)
+        except OSError:
+            return None, None
+
+        metrics.inc('content_hashes')
+        digest = h.hexdigest()
+        return digest, (path, size, mtime_ns, digest)
+
+    def invalidate(self) -> None:
+        """Glömmer versionernas hashtabeller (filhasharna i trädindexet ligger kvar)"""
+        self._versions.invalidate()
+
+    def stats(self) -> Dict:
+        return self._versions.stats()
+
+
+def _node_key(node: Dict):
+    return node.get('sid') or node.get('fullname') or node.get('name')
+
+
+def diff_hierarchies(product: str, old: List[Dict], new: List[Dict],
+                     old_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> Dict:
+    """Jämför två hierarkier per sid
+
+    Subsystem som bara finns i den ena versionen rapporteras som tillagda
+    eller borttagna. Subsystem med samma sid men ny förälder räknas som
+    flyttade, med samma förälder men nytt namn som omdöpta. Diagram räknas
+    som ändrade när hashen för deras _d.svg eller _d.json skiljer sig.
+    """
+    old_by_key = {_node_key(node): node for node in old}
+    new_by_key = {_node_key(node): node for node in new}
+    old_by_hid = {node.get('hid'): node for node in old}
+    new_by_hid = {node.get('hid'): node for node in new}
+
+    def parent_key(node: Dict, by_hid: Dict):
+        parent = by_hid.get(node.get('parent'))
+        return _node_key(parent) if parent is not None else None
+
+    def summary(node: Dict) -> Dict:
+        return {"sid": node.get('sid'), "fullname": node.get('fullname', node.get('name')), "hid": node.get('hid')}
+
+    added = [summary(new_by_key[key]) for key in new_by_key if key not in old_by_key]
+    removed = [summary(old_by_key[key]) for key in old_by_key if key not in new_by_key]
+    moved = []
+    renamed = []
+    changed = []
+    unchanged = 0
+
+    for key, new_node in new_by_key.items():
+        old_node = old_by_key.get(key)
+        if old_node is None:
+            continue
+
+        old_parent = parent_key(old_node, old_by_hid)
+        new_parent = parent_key(new_node, new_by_hid)
+        if old_parent != new_parent:
+            moved.append({
+                "sid": new_node.get('sid'),
+                "from_fullname": old_node.get('fullname'),
+                "to_fullname": new_node.get('fullname'),
+                "from_parent": old_parent,
+                "to_parent": new_parent,
+                "from_hid": old_node.get('hid'),
+                "to_hid": new_node.get('hid')
+            })
+        elif old_node.get('name') != new_node.get('name'):
+            renamed.append({
+                "sid": new_node.get('sid'),
+                "from_name": old_node.get('name'),
+                "to_name": new_node.get('name'),
+                "from_hid": old_node.get('hid'),
+                "to_hid": new_node.get('hid')
+            })
+
+        changed_files = [
+            name for old_name, name in zip(diagram_files(old_node, product), diagram_files(new_node, product))
+            if old_hashes.get(old_name) != new_hashes.get(name)
+        ]
+        if changed_files:
+            changed.append({
+                "sid": new_node.get('sid'),
+                "fullname": new_node.get('fullname', new_node.get('name')),
+                "from_hid": old_node.get('hid'),
+                "to_hid": new_node.get('hid'),
+                "files": changed_files
+            })
+        else:
+            unchanged += 1
+
+    return {
+        "summary": {
+            "added": len(added),
+            "removed": len(removed),
+            "moved": len(moved),
+            "renamed": len(renamed),
+            "changed": len(changed),
+            "unchanged": unchanged
+        },
+        "added": added,
+        "removed": removed,
+        "moved": moved,
+        "renamed": renamed,
+        "changed": changed
+    }
@@ -13,9 +13,14 @@ const state = {
     currentVersion: null,
     navigationTree: null,
     currentNode: null,
-    zoomLevel: 1.0
+    zoomLevel: 1.0,
+    svgCache: new Map(),
+    thumbnails: new Map()
 };
 
+// Max antal förhämtade SVG:er i klientens cache
+const SVG_CACHE_MAX_ENTRIES = 64;
+
 // DOM-element
 const elements = {
     welcomeScreen: null,
@@ -256,14 +261,17 @@ async function loadProductVersion(productName, version) {
     try {
         state.currentProduct = productName;
         state.currentVersion = version;
+        state.svgCache.clear();
+        clearThumbnails();
         
-        const response = await fetch(`${API_BASE_URL}/product/${productName}/version/${version}/tree`);
-        const data = await response.json();
+        const response = await fetch(`${API_BASE_URL}/product/${productName}/version/${version}/tree?format=compact`);
+        const compact = await response.json();
         
-        if (data.error) {
-            throw new Error(data.error);
+        if (compact.error) {
+            throw new Error(compact.error);
         }
         
+        const data = expandCompactTree(compact);
         state.navigationTree = data;
         
         showMainApp();
@@ -273,6 +281,7 @@ async function loadProductVersion(productName, version) {
         
         renderNavigationTree(data);
         loadNode(data);
+        loadThumbnails(productName, version);
         
         console.log('Träd laddat:', data);
     } catch (error) {
@@ -282,6 +291,99 @@ async function loadProductVersion(productName, version) {
     }
 }
 
+/**
+ * Bygg filnamn från sid (PS200:51722 → PS200_51722_d.svg), samma regel som backend
+ */
+function sidFilename(sid, suffix) {
+    if (!sid || !sid.includes(':')) return null;
+    const [prefix, number] = sid.split(':');
+    return `${prefix}_${number}${suffix}`;
+}
+
+/**
+ * Avkoda kompakt trädformat (?format=compact) till nästlade noder
+ */
+function expandCompactTree(data) {
+    const root = expandCompactNodes(data, data.nodes, data.product);
+    
+    // Externa hierarkier delas av alla block som refererar samma modell
+    if (data.external_hierarchies) {
+        root.external_hierarchies = {};
+        Object.entries(data.external_hierarchies).forEach(([filename, rows]) => {
+            root.external_hierarchies[filename] = expandCompactNodes(data, rows, filename.replace(/_diagrams_1\.json$/, ''));
+        });
+    }
+    ['external_cycles', 'external_errors'].forEach(key => {
+        if (data[key]) root[key] = data[key];
+    });
+    
+    return root;
+}
+
+function expandCompactNodes(data, rows, product) {
+    const s = index => (index === null || index === undefined) ? null : data.strings[index];
+    const jsonFromSvg = svg => (svg && svg.endsWith('.svg')) ? svg.slice(0, -4) + '.json' : null;
+    const byHid = new Map();
+    let root = null;
+    
+    rows.forEach(([hid, parentHid, nameI, labelI, fullnameI, sidI, classI, iconI, svgI, jsonI, clickable]) => {
+        const parent = byHid.get(parentHid);
+        const level = parent ? parent.level + 1 : 0;
+        const name = s(nameI);
+        const svg = s(svgI);
+        const json = jsonI === null ? jsonFromSvg(svg) : s(jsonI);
+        
+        const clickableElements = clickable.map(([eSidI, eNameI, eLabelI, eIconI, eHid, typeI]) => {
+            const sid = s(eSidI);
+            const elementName = s(eNameI);
+            const hierarchyType = s(typeI);
+            const element = {
+                sid,
+                name: elementName,
+                label: eLabelI === null ? elementName : s(eLabelI),
+                icon: s(eIconI),
+                svg: sidFilename(sid, '_d.svg'),
+                json: sidFilename(sid, '_d.json'),
+                hid: eHid,
+                has_children: hierarchyType === 'internal' || hierarchyType === 'external',
+                hierarchy_type: hierarchyType
+            };
+            if (hierarchyType === 'external') {
+                element.external_hierarchy = `${elementName}_diagrams_1.json`;
+            }
+            return element;
+        });
+        
+        const node = {
+            name,
+            label: labelI === null ? name : s(labelI),
+            fullname: fullnameI === null ? name : s(fullnameI),
+            hid,
+            sid: s(sidI),
+            className: s(classI),
+            icon: s(iconI),
+            svg,
+            json,
+            svg_path: svg,
+            json_path: json,
+            children: [],
+            level,
+            is_root: level === 0,
+            product,
+            clickable_elements: clickableElements
+        };
+        
+        byHid.set(hid, node);
+        if (parent) {
+            parent.children.push(node);
+        } else {
+            root = node;
+        }
+    });
+    
+    return root;
+}
+
 /**
  * Rendera navigeringsträdet
  */
@@ -292,6 +394,74 @@ function renderNavigationTree(tree) {
     showLoading(false);
 }
 
+/**
+ * Hämta alla thumbnails för versionen i en bunt: 4 bytes indexlängd, JSON-index, bilddata
+ */
+async function loadThumbnails(product, version) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/product/${product}/version/${version}/thumbnails`);
+        if (!response.ok) return;
+        
+        const buffer = await response.arrayBuffer();
+        const indexLength = new DataView(buffer).getUint32(0);
+        const index = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, indexLength)));
+        const dataStart = 4 + indexLength;
+        
+        // Användaren kan ha bytt version medan anropet pågick
+        if (product !== state.currentProduct || version !== state.currentVersion) return;
+        
+        const urls = new Map();
+        Object.entries(index.thumbnails).forEach(([hid, [offset, length, type]]) => {
+            const key = `${offset}:${length}`;
+            if (!urls.has(key)) {
+                const blob = new Blob([buffer.slice(dataStart + offset, dataStart + offset + length)], { type });
+                urls.set(key, URL.createObjectURL(blob));
+            }
+            state.thumbnails.set(Number(hid), urls.get(key));
+        });
+        
+        console.log(`Thumbnails laddade: ${index.count}`);
+    } catch (error) {
+        console.warn('Kunde inte ladda thumbnails:', error);
+    }
+}
+
+/**
+ * Släpp thumbnails från föregående version
+ */
+function clearThumbnails() {
+    new Set(state.thumbnails.values()).forEach(url => URL.revokeObjectURL(url));
+    state.thumbnails.clear();
+    hideThumbnailPreview();
+}
+
+/**
+ * Visa nodens thumbnail bredvid trädraden
+ */
+function showThumbnailPreview(item, hid) {
+    const url = state.thumbnails.get(hid);
+    if (!url) return;
+    
+    let preview = document.getElementById('thumbnail-preview');
+    if (!preview) {
+        preview = document.createElement('img');
+        preview.id = 'thumbnail-preview';
+        preview.className = 'thumbnail-preview';
+        document.body.appendChild(preview);
+    }
+    
+    const rect = item.getBoundingClientRect();
+    preview.src = url;
+    preview.style.left = `${rect.right + 8}px`;
+    preview.style.top = `${rect.top}px`;
+    preview.classList.remove('hidden');
+}
+
+function hideThumbnailPreview() {
+    const preview = document.getElementById('thumbnail-preview');
+    if (preview) preview.classList.add('hidden');
+}
+
 /**
  * Bygg DOM-element för en trädnod rekursivt
  */
@@ -313,6 +483,9 @@ function buildTreeNode(node, level = 0) {
         ${node.children && node.children.length > 0 ? ` (${node.children.length})` : ''}
     `;
     
+    item.addEventListener('mouseenter', () => showThumbnailPreview(item, node.hid));
+    item.addEventListener('mouseleave', hideThumbnailPreview);
+    
     item.addEventListener('click', (e) => {
         e.stopPropagation();
         
@@ -356,16 +529,14 @@ async function loadNode(node) {
     state.currentNode = node;
     
     try {
-        const svgResponse = await fetch(
-            `${API_BASE_URL}/product/${state.currentProduct}/version/${state.currentVersion}/file/${node.svg_path}`
-        );
-        const svgContent = await svgResponse.text();
+        const svgContent = await fetchSVG(node.svg_path);
         
         displaySVG(svgContent, node);
         updateFileInfo(node);
         elements.currentFileName.textContent = node.svg;
         
         console.log('Fil laddad:', node.name);
+        prefetchClickableSVGs(node);
     } catch (error) {
         console.error('Fel vid laddning av fil:', error);
         showError(`Kunde inte ladda fil: ${error.message}`);
@@ -374,6 +545,63 @@ async function loadNode(node) {
     }
 }
 
+/**
+ * Hämta en SVG, från klientens cache om den förhämtats
+ */
+async function fetchSVG(svgFilename) {
+    const cached = state.svgCache.get(svgFilename);
+    if (cached !== undefined) {
+        return cached;
+    }
+    
+    const response = await fetch(
+        `${API_BASE_URL}/product/${state.currentProduct}/version/${state.currentVersion}/file/${svgFilename}`
+    );
+    
+    if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+    
+    return response.text();
+}
+
+/**
+ * Förhämta SVG:erna bakom nodens klickbara element i ett enda anrop
+ */
+async function prefetchClickableSVGs(node) {
+    const names = [...new Set((node.clickable_elements || []).map(el => el.svg).filter(Boolean))]
+        .filter(name => !state.svgCache.has(name))
+        .slice(0, SVG_CACHE_MAX_ENTRIES);
+    if (names.length === 0) return;
+    
+    const product = state.currentProduct;
+    const version = state.currentVersion;
+    
+    try {
+        const response = await fetch(`${API_BASE_URL}/product/${product}/version/${version}/files`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ names })
+        });
+        if (!response.ok) return;
+        
+        const data = await response.json();
+        
+        // Användaren kan ha bytt version medan anropet pågick
+        if (product !== state.currentProduct || version !== state.currentVersion) return;
+        
+        Object.entries(data.files || {}).forEach(([name, content]) => {
+            state.svgCache.delete(name);
+            state.svgCache.set(name, content);
+        });
+        while (state.svgCache.size > SVG_CACHE_MAX_ENTRIES) {
+            state.svgCache.delete(state.svgCache.keys().next().value);
+        }
+    } catch (error) {
+        console.warn('Förhämtning misslyckades:', error);
+    }
+}
+
 /**
  * Visa SVG i huvudområdet
  */
@@ -588,11 +816,18 @@ function handleSVGElementDoubleClick(svgElement, clickableElement, currentNode)
         console.log('📊 Extern hierarki:', clickableElement.external_hierarchy);
         console.log('📊 SVG:', clickableElement.svg);
         
-        // TODO: Implementera laddning av extern hierarki
-        showError(`ModelReference "${clickableElement.name}" har egen hierarki (${clickableElement.external_hierarchy}).\n\nSteg att implementera:\n1. Ladda ${clickableElement.external_hierarchy}\n2. Bygg nytt träd\n3. Visa ${clickableElement.svg}`);
+        // Backend har redan löst upp hierarkin en gång per modell
+        const externals = state.navigationTree.external_hierarchies || {};
+        const externalRoot = externals[clickableElement.external_hierarchy];
         
-        // Tillfällig lösning: visa bara SVG:n
-        loadSVGOnly(clickableElement.svg, clickableElement.name);
+        if (externalRoot) {
+            console.log('✅ Navigerar till extern:', externalRoot.name);
+            loadNode(externalRoot);
+        } else {
+            // Hierarkin kunde inte läsas (eller leder tillbaka i en cykel) - visa bara SVG:n
+            console.warn('⚠️  Extern hierarki saknas i trädet:', clickableElement.external_hierarchy);
+            loadSVGOnly(clickableElement.svg, clickableElement.name);
+        }
     }
     else if (clickableElement.hierarchy_type === 'leaf') {
         // Leaf node - ingen vidare navigation
@@ -623,15 +858,7 @@ async function loadSVGOnly(svgFilename, elementName) {
     showLoading(true);
     
     try {
-        const response = await fetch(
-            `${API_BASE_URL}/product/${state.currentProduct}/version/${state.currentVersion}/file/${svgFilename}`
-        );
-        
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-        }
-        
-        const svgText = await response.text();
+        const svgText = await fetchSVG(svgFilename);
         
         // Visa SVG utan att ändra träd-state
         elements.svgStackContainer.innerHTML = svgText;
@@ -684,6 +911,8 @@ function showWelcomeScreen() {
     state.currentVersion = null;
     state.currentProduct = null;
     state.navigationTree = null;
+    state.svgCache.clear();
+    clearThumbnails();
     state.currentNode = null;
     
     loadProducts();